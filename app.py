@@ -1,4 +1,4 @@
-import os
+import atexit
 import threading
 
 from flask import Flask
@@ -6,40 +6,18 @@ from database import init_db
 from services import init_tts_client, init_text_client
 from errors import register_error_handlers
 from config import config
-
-# Ensure instance directory exists for database
-INSTANCE_DIR = os.path.join(os.path.dirname(__file__), "instance")
-os.makedirs(INSTANCE_DIR, exist_ok=True)
-
-app = Flask(__name__)
-app.config["UPLOAD_FOLDER"] = config.UPLOAD_FOLDER
-app.config["GENERATED_AUDIO_FOLDER"] = config.GENERATED_AUDIO_FOLDER
-app.config["SQLALCHEMY_DATABASE_URI"] = config.SQLALCHEMY_DATABASE_URI
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = config.SQLALCHEMY_ENGINE_OPTIONS
-app.config["SERVER_NAME"] = config.SERVER_NAME
-app.config["PREFERRED_URL_SCHEME"] = config.PREFERRED_URL_SCHEME
-app.config["APPLICATION_ROOT"] = config.APPLICATION_ROOT
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = config.SQLALCHEMY_TRACK_MODIFICATIONS
-app.config["MAX_CONTENT_LENGTH"] = config.MAX_CONTENT_LENGTH
-
-issues = config.validate()
-if issues:
-    for issue in issues:
-        app.logger.warning(f"Config issue: {issue}")
-
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-os.makedirs(app.config["GENERATED_AUDIO_FOLDER"], exist_ok=True)
-
-init_db(app)
-
+from utils.fastjson import FastJSONProvider
+from utils.uploads import UploadRequest
 from utils.task_queue import TaskQueue
 from tasks.workers import (
     _run_summary_generation,
     _run_transcript_generation,
     _run_podcast_generation,
+    shutdown_background_jobs,
 )
+from routes import register_blueprints
 
-task_queue = TaskQueue.get_instance(max_workers=3)
+task_queue = TaskQueue.get_instance(max_workers=config.TASK_QUEUE_WORKERS)
 task_queue.register_handler("summary", _run_summary_generation)
 task_queue.register_handler("transcript", _run_transcript_generation)
 task_queue.register_handler("podcast", _run_podcast_generation)
@@ -47,30 +25,70 @@ task_queue.register_handler("podcast", _run_podcast_generation)
 _worker_start_lock = threading.Lock()
 
 
-@app.before_request
-def start_workers_if_needed():
-    with _worker_start_lock:
-        if not task_queue._running:
-            task_queue.start_workers(app)
-
-
-import atexit
-
-
 def cleanup_task_queue():
     task_queue.stop_workers()
+    shutdown_background_jobs()
 
 
 atexit.register(cleanup_task_queue)
 
-from routes import register_blueprints
-
-register_blueprints(app)
-
-register_error_handlers(app)
 
-init_tts_client(app)
-init_text_client(app)
+def create_app(test_config=None):
+    """
+    Build and configure the Flask app.
+
+    test_config overrides settings before the database is bound, so tests
+    can point the app at an in-memory database. API clients are not built
+    when TESTING is set.
+    """
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.json = FastJSONProvider(app)
+    app.config["SECRET_KEY"] = config.SECRET_KEY
+    app.config["UPLOAD_FOLDER"] = config.UPLOAD_FOLDER
+    app.config["GENERATED_AUDIO_FOLDER"] = config.GENERATED_AUDIO_FOLDER
+    app.config["SQLALCHEMY_DATABASE_URI"] = config.SQLALCHEMY_DATABASE_URI
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = config.SQLALCHEMY_ENGINE_OPTIONS
+    app.config["SERVER_NAME"] = config.SERVER_NAME
+    app.config["PREFERRED_URL_SCHEME"] = config.PREFERRED_URL_SCHEME
+    app.config["APPLICATION_ROOT"] = config.APPLICATION_ROOT
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config["MAX_CONTENT_LENGTH"] = config.MAX_CONTENT_LENGTH
+    app.config["UPLOAD_PART_MAX_AGE"] = config.UPLOAD_PART_MAX_AGE
+    app.config["X_ACCEL_REDIRECT_PREFIX"] = config.X_ACCEL_REDIRECT_PREFIX
+    app.config["X_ACCEL_TRUSTED_PROXIES"] = config.X_ACCEL_TRUSTED_PROXIES
+    app.config["STORED_FILE_MAX_AGE"] = config.STORED_FILE_MAX_AGE
+    app.config["TASK_QUEUE_MAX_PENDING"] = config.TASK_QUEUE_MAX_PENDING
+    app.use_x_sendfile = config.USE_X_SENDFILE
+    if test_config:
+        app.config.update(test_config)
+
+    # Also creates the instance, upload and audio folders
+    issues = config.validate()
+    if issues:
+        for issue in issues:
+            app.logger.warning(f"Config issue: {issue}")
+
+    init_db(app)
+
+    @app.before_request
+    def start_workers_if_needed():
+        with _worker_start_lock:
+            if not task_queue._running:
+                task_queue.start_workers(app)
+
+    register_blueprints(app)
+
+    register_error_handlers(app)
+
+    if not app.config.get("TESTING"):
+        init_tts_client(app)
+        init_text_client(app)
+
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=config.DEBUG)
@@ -20,6 +20,10 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS: dict = {
         "pool_pre_ping": True,
         "pool_recycle": 300,
+        # Request threads and background jobs each hold a connection; jobs
+        # give theirs back while waiting on the text and TTS APIs
+        "pool_size": 10,
+        "max_overflow": 20,
     }
 
     # Folders
@@ -30,15 +34,63 @@ class Config:
 
     # Server
     SERVER_NAME: Optional[str] = os.environ.get("SERVER_NAME")
+    # Hand uploads/audio to the front-end server instead of streaming them
+    # through Python: X-Sendfile (Apache/lighttpd) or nginx X-Accel-Redirect
+    USE_X_SENDFILE: bool = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
+    X_ACCEL_REDIRECT_PREFIX: Optional[str] = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
+    # Proxy addresses whose requests get X-Accel-Redirect; a client reaching
+    # the app from anywhere else is sent the file itself
+    X_ACCEL_TRUSTED_PROXIES: set = {
+        addr.strip()
+        for addr in os.environ.get(
+            "X_ACCEL_TRUSTED_PROXIES", "127.0.0.1,::1"
+        ).split(",")
+        if addr.strip()
+    }
+    STORED_FILE_MAX_AGE: int = int(
+        os.environ.get("STORED_FILE_MAX_AGE", 3600)
+    )  # Seconds browsers may reuse an upload/MP3 before revalidating its ETag
     PREFERRED_URL_SCHEME: str = os.environ.get("PREFERRED_URL_SCHEME", "http")
     APPLICATION_ROOT: str = os.environ.get("APPLICATION_ROOT", "/")
 
     # Upload limits
+    # Resumable uploads left unfinished this long (seconds) are deleted
+    UPLOAD_PART_MAX_AGE: int = int(os.environ.get("UPLOAD_PART_MAX_AGE", 86400))
     MAX_CONTENT_LENGTH: int = int(
         os.environ.get("MAX_CONTENT_LENGTH", 50 * 1024 * 1024)
     )  # 50MB default
     ALLOWED_EXTENSIONS: set = {"pdf"}
 
+    # PDF processing - pages are split across worker processes for large files
+    PDF_PROCESS_WORKERS: int = int(
+        os.environ.get("PDF_PROCESS_WORKERS", os.cpu_count() or 1)
+    )
+    PDF_PARALLEL_MIN_PAGES: int = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 8))
+    PDF_MIN_PAGES_PER_TASK: int = int(
+        os.environ.get("PDF_MIN_PAGES_PER_TASK", 2)
+    )  # Each range re-opens the document, so don't split finer than this
+
+    # Background jobs (uploads, summaries, transcripts, podcasts) run at once;
+    # more are queued until a slot frees up
+    BACKGROUND_WORKERS: int = int(os.environ.get("BACKGROUND_WORKERS", 8))
+
+    # Summary/transcript/podcast jobs run by the task queue at once, and how
+    # many may wait before new requests are turned away with 429
+    TASK_QUEUE_WORKERS: int = int(os.environ.get("TASK_QUEUE_WORKERS", 3))
+    TASK_QUEUE_MAX_PENDING: int = int(os.environ.get("TASK_QUEUE_MAX_PENDING", 100))
+    # Seconds status polls for a running task are answered from memory before
+    # the database is read again
+    TASK_STATUS_RECHECK: int = int(os.environ.get("TASK_STATUS_RECHECK", 10))
+    # Unfinished tasks whose last status poll is kept; least recently polled
+    # drop out first
+    TASK_STATUS_CACHE_SIZE: int = int(os.environ.get("TASK_STATUS_CACHE_SIZE", 256))
+
+    # Text generation - completions in flight at once across all tasks
+    LLM_CONCURRENCY: int = int(os.environ.get("LLM_CONCURRENCY", 8))
+
+    # Podcast generation - concurrent TTS requests per podcast
+    TTS_CONCURRENCY: int = int(os.environ.get("TTS_CONCURRENCY", 4))
+
     # Default models (can be overridden in database settings)
     DEFAULT_SUMMARY_MODEL: str = os.environ.get("SUMMARY_MODEL", "openai/gpt-5.2")
     DEFAULT_TRANSCRIPT_MODEL: str = os.environ.get("TRANSCRIPT_MODEL", "openai/gpt-5.2")
@@ -52,6 +104,21 @@ class Config:
     # Caching
     CACHE_TTL: int = int(os.environ.get("CACHE_TTL", 300))  # 5 minutes
     CACHE_ENABLED: bool = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+    DOCUMENT_CACHE_TTL: int = int(
+        os.environ.get("DOCUMENT_CACHE_TTL", 3600)
+    )  # Ragflow document text, reused across summary/transcript/chat
+    SETTINGS_CACHE_TTL: int = int(
+        os.environ.get("SETTINGS_CACHE_TTL", 5)
+    )  # How long other worker processes may serve settings saved by one of them
+    PDF_FILE_CACHE_TTL: int = int(
+        os.environ.get("PDF_FILE_CACHE_TTL", 5)
+    )  # PDFFile rows looked up by id, dropped whenever the row is written
+    PDF_ELEMENTS_CACHE_SIZE: int = int(
+        os.environ.get("PDF_ELEMENTS_CACHE_SIZE", 64)
+    )  # Files whose figures/tables are kept parsed for the figures panel
+    CHAT_CACHE_MAX_ROWS: int = int(
+        os.environ.get("CHAT_CACHE_MAX_ROWS", 1000)
+    )  # Cached chat replies kept; the oldest are dropped beyond this
 
     # Security
     SECRET_KEY: Optional[str] = os.environ.get("SECRET_KEY")
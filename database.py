@@ -1,9 +1,18 @@
 import os
-import json
 import logging
+import threading
+import time
+import uuid
 
+from flask import abort, current_app, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from config import config
+from utils import fastjson
+from utils.cache import LRUCache, RagFlowCache
 
 logger = logging.getLogger(__name__)
 
@@ -39,13 +48,22 @@ class PDFFile(db.Model):
     text = db.Column(
         db.Text, nullable=True
     )  # Optional - for legacy uploads; new imports fetch from Ragflow
-    figures = db.Column(db.Text)
-    captions = db.Column(db.Text)
+    # Legacy JSON; elements now live in PDFElement. Deferred so loading a
+    # file doesn't pull these blobs
+    figures = db.deferred(db.Column(db.Text))
+    captions = db.deferred(db.Column(db.Text))
     summary = db.Column(db.Text, nullable=True)
     transcript = db.Column(db.Text, nullable=True)
     tags = db.Column(db.Text, nullable=True)  # JSON array of tags
     chat_history = db.Column(db.Text, nullable=True)  # Store as JSON string
     folder_id = db.Column(db.Integer, db.ForeignKey("folder.id"), nullable=True)
+    elements = db.relationship(
+        "PDFElement",
+        backref="file",
+        lazy=True,
+        order_by="PDFElement.order_idx",
+        cascade="all, delete-orphan",
+    )
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(
         db.DateTime,
@@ -64,9 +82,31 @@ class PDFFile(db.Model):
         db.String(200), nullable=True
     )  # Friendly dataset name for UI
 
+    content_hash = db.Column(
+        db.String(64), nullable=True
+    )  # BLAKE3 (or SHA-256) hex digest of the uploaded PDF bytes
+    audio_hash = db.Column(
+        db.String(64), nullable=True
+    )  # Transcript, voices and TTS model the podcast MP3 was made from
+    audio_generated_at = db.Column(
+        db.DateTime, nullable=True
+    )  # When the podcast MP3 was written; None while there is no MP3
+    storage_name = db.Column(
+        db.String(64), nullable=True
+    )  # Names the stored PDF, figures and MP3, so renaming moves nothing on disk
+
+    # Set by list views (via with_expression) that defer the large text
+    # columns but still show whether a summary/text exists
+    has_summary = db.query_expression()
+    has_text = db.query_expression()
+
     __table_args__ = (
         db.Index("ix_pdffile_ragflow", "ragflow_document_id", "ragflow_dataset_id"),
         db.Index("ix_pdffile_created", "created_at"),
+        db.Index("ix_pdffile_content_hash", "content_hash"),
+        db.Index("ix_pdffile_folder", "folder_id"),
+        db.Index("ix_pdffile_dataset_name", "ragflow_dataset_name"),
+        db.Index("ix_pdffile_storage_name", "storage_name", unique=True),
     )
 
     # Helper property to check if content should be fetched from Ragflow
@@ -75,15 +115,33 @@ class PDFFile(db.Model):
         """Returns True if this file should fetch content from Ragflow."""
         return bool(self.ragflow_document_id and self.ragflow_dataset_id)
 
+    @property
+    def storage_stem(self):
+        return pdf_storage_stem(self)
+
+    @property
+    def audio_version(self):
+        """Short tag that changes whenever the podcast MP3 is regenerated."""
+        if not self.audio_hash:
+            return None
+        if not self.audio_generated_at:
+            return self.audio_hash[:12]
+        # A forced re-voicing keeps the hash, so the time tells the MP3s apart
+        return f"{self.audio_hash[:8]}{int(self.audio_generated_at.timestamp()):x}"
+
     @property
     def tags_list(self):
-        """Get tags as a Python list."""
+        """Get tags as a Python list, parsed once per value of the column."""
         if not self.tags:
             return []
-        try:
-            return json.loads(self.tags)
-        except:
-            return []
+        parsed = self.__dict__.get("_tags_parsed")
+        if parsed is None or parsed[0] is not self.tags:
+            try:
+                tags = fastjson.loads(self.tags)
+            except:
+                tags = []
+            parsed = self.__dict__["_tags_parsed"] = (self.tags, tags)
+        return parsed[1]
 
     # Helper property to get content (from local or fetch from Ragflow)
     def get_content(self, ragflow_client=None):
@@ -108,9 +166,35 @@ class PDFFile(db.Model):
         return f"<PDFFile {self.filename}>"
 
 
+class PDFElement(db.Model):
+    """A captioned figure or table extracted from a PDF, in document order."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey("pdf_file.id"), nullable=False)
+    order_idx = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)  # "figure" or "table"
+    path = db.Column(
+        db.String(500), nullable=True
+    )  # Figure image name, relative to the file's figure directory
+    caption = db.Column(db.Text, nullable=True)
+    page = db.Column(db.Integer, nullable=True)
+    data = db.Column(db.Text, nullable=True)  # JSON rows for tables
+
+    __table_args__ = (db.Index("ix_pdf_element_file_order", "file_id", "order_idx"),)
+
+    def to_dict(self, figure_dir):
+        """Serialize in the shape the figures panel expects."""
+        return _element_dict(
+            figure_dir, self.type, self.caption, self.page, self.path, self.data
+        )
+
+    def __repr__(self):
+        return f"<PDFElement {self.file_id}:{self.order_idx} [{self.type}]>"
+
+
 class Task(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID length
-    status = db.Column(db.String(20), nullable=False, default="processing", index=True)
+    status = db.Column(db.String(20), nullable=False, default="processing")
     result = db.Column(db.Text, nullable=True)  # Will store JSON result
 
     __table_args__ = (db.Index("ix_task_status", "status"),)
@@ -119,6 +203,67 @@ class Task(db.Model):
         return f"<Task {self.id} [{self.status}]>"
 
 
+class SummaryCache(db.Model):
+    """Summaries keyed by PDF content, model and prompt, reused across uploads."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    prompt_hash = db.Column(db.String(64), nullable=False)
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index(
+            "ix_summary_cache_key", "content_hash", "model", "prompt_hash", unique=True
+        ),
+    )
+
+    def __repr__(self):
+        return f"<SummaryCache {self.content_hash[:12]} [{self.model}]>"
+
+
+class TranscriptCache(db.Model):
+    """Podcast scripts keyed by PDF content, model and prompt."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    prompt_hash = db.Column(db.String(64), nullable=False)
+    transcript = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index(
+            "ix_transcript_cache_key",
+            "content_hash",
+            "model",
+            "prompt_hash",
+            unique=True,
+        ),
+    )
+
+    def __repr__(self):
+        return f"<TranscriptCache {self.content_hash[:12]} [{self.model}]>"
+
+
+class ChatResponseCache(db.Model):
+    """Chat replies keyed by a hash of the model and the full message list."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index("ix_chat_response_cache_key", "request_hash", unique=True),
+        db.Index("ix_chat_response_cache_created", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<ChatResponseCache {self.request_hash[:12]}>"
+
+
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     lock = db.Column(
@@ -198,7 +343,85 @@ class Settings(db.Model):
         return f"<Settings {self.id}>"
 
 
-def get_settings():
+def _element_dict(figure_dir, element_type, caption, page, path, data):
+    element = {"type": element_type, "caption": caption, "page": page}
+    if element_type == "table":
+        # Only ever re-serialized, so skip parsing where orjson allows
+        element["data"] = fastjson.raw(data) if data else []
+    else:
+        element["path"] = f"{figure_dir}/{path}" if path else None
+    return element
+
+
+def pdf_element_dicts(file_id, figure_dir):
+    """
+    A file's elements as to_dict() dicts, read without building ORM objects.
+
+    Figure paths are joined onto figure_dir, a directory or URL prefix.
+    """
+    rows = db.session.execute(
+        db.select(
+            PDFElement.type,
+            PDFElement.caption,
+            PDFElement.page,
+            PDFElement.path,
+            PDFElement.data,
+        )
+        .where(PDFElement.file_id == file_id)
+        .order_by(PDFElement.order_idx)
+    )
+    return [_element_dict(figure_dir, *row) for row in rows]
+
+
+def pdf_element_rows(file_id, elements):
+    """Turn process_pdf element dicts into PDFElement insert mappings."""
+    rows = []
+    for order_idx, element in enumerate(elements):
+        if isinstance(element, str):  # Oldest uploads stored bare image paths
+            element = {"type": "figure", "path": element}
+        table_data = element.get("data")
+        path = element.get("path")
+        rows.append(
+            {
+                "file_id": file_id,
+                "order_idx": order_idx,
+                "type": element.get("type", "figure"),
+                "path": os.path.basename(path) if path else None,
+                "caption": element.get("caption"),
+                "page": element.get("page"),
+                "data": fastjson.dumps(table_data) if table_data is not None else None,
+            }
+        )
+    return rows
+
+
+# The settings row only changes through the settings page, so keep a detached
+# copy per app and merge it into each session instead of querying it every call.
+# Other worker processes can't see invalidate_settings_cache(), so the copy is
+# also reloaded after SETTINGS_CACHE_TTL seconds.
+def _settings_cache():
+    return current_app.extensions.setdefault(
+        "settings_cache", {"value": None, "loaded_at": 0.0}
+    )
+
+
+def invalidate_settings_cache():
+    """Drop the cached settings; call after committing changes to them."""
+    _settings_cache()["value"] = None
+    g.pop("settings", None)
+
+
+def _detached_copy(model, ident, options=()):
+    """Load a row in a throwaway session so the copy is never tied to (or
+    expired by) a request's session."""
+    with Session(db.engine) as snapshot_session:
+        snapshot = snapshot_session.get(model, ident, options=options)
+        if snapshot is not None:
+            snapshot_session.expunge(snapshot)
+    return snapshot
+
+
+def _load_settings():
     settings = Settings.query.first()
     if settings:
         return settings
@@ -218,8 +441,212 @@ def get_settings():
     return Settings.query.first()
 
 
+def get_settings():
+    # Within one request or task, hand back the same instance every call
+    settings = g.get("settings")
+    if settings is not None:
+        return settings
+
+    cache = _settings_cache()
+    cached = cache["value"]
+    if (
+        cached is not None
+        and time.monotonic() - cache["loaded_at"] < config.SETTINGS_CACHE_TTL
+    ):
+        settings = db.session.merge(cached, load=False)
+    else:
+        settings = _load_settings()
+        if settings is None:
+            return None
+        cache["value"] = _detached_copy(Settings, settings.id)
+        cache["loaded_at"] = time.monotonic()
+
+    g.settings = settings
+    return settings
+
+
+# Status polling and detail panes look the same file up many times a second;
+# a short-lived detached copy per id saves the round trip for each of them.
+def _pdf_file_cache():
+    return current_app.extensions.setdefault(
+        "pdf_file_cache", RagFlowCache(ttl_seconds=config.PDF_FILE_CACHE_TTL)
+    )
+
+
+def invalidate_pdf_file_cache(file_id):
+    _pdf_file_cache().invalidate(file_id)
+
+
+def new_storage_name():
+    """Random name for a new file's stored PDF, figure directory and podcast."""
+    return uuid.uuid4().hex
+
+
+def pdf_storage_stem(pdf_file):
+    """
+    Stem of the names a file's stored PDF, figure directory and podcast use.
+
+    Files stored before storage_name existed were named after their filename;
+    rename_file pins that as their storage_name before changing it.
+    """
+    return pdf_file.storage_name or os.path.splitext(pdf_file.filename)[0]
+
+
+def release_connection():
+    """
+    End the session's transaction so its pooled connection (and SQLite read
+    snapshot) isn't held through a long API call.
+
+    Loaded objects are kept as they are instead of being expired, so using
+    them afterwards doesn't query again.
+    """
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire_on_commit
+
+
+def get_pdf_file_or_404(file_id):
+    """PDFFile.query.get_or_404 that reuses a recently loaded copy of the row."""
+    cache = _pdf_file_cache()
+    cached = cache.get(file_id)
+    if cached is None:
+        # Legacy uploads keep the full extracted text locally; it can run to
+        # megabytes, so leave it out of the cached copy and load it on access
+        cached = _detached_copy(PDFFile, file_id, options=[db.defer(PDFFile.text)])
+        if cached is None:
+            abort(404)
+        cache.set(file_id, cached)
+    return db.session.merge(cached, load=False)
+
+
+# The library's tag filter needs every file's tags; keep the parsed set
+def library_tags_cache():
+    return current_app.extensions.setdefault(
+        "library_tags_cache", RagFlowCache(ttl_seconds=config.PDF_FILE_CACHE_TTL)
+    )
+
+
+@event.listens_for(PDFFile, "after_update")
+@event.listens_for(PDFFile, "after_delete")
+def _drop_cached_pdf_file(mapper, connection, target):
+    if current_app:
+        invalidate_pdf_file_cache(target.id)
+        library_tags_cache().invalidate("all")
+
+
+@event.listens_for(PDFFile, "after_insert")
+def _drop_cached_library_tags(mapper, connection, target):
+    if current_app:
+        library_tags_cache().invalidate("all")
+
+
+# Statuses after which a task's row no longer changes
+FINISHED_TASK_STATUSES = ("complete", "error")
+
+# Events for tasks someone is waiting on over /task_stream, set once the
+# task's finished status has been committed
+_task_watchers = {}
+_task_watchers_lock = threading.Lock()
+
+
+def watch_task(task_id):
+    """Return an Event that is set when task_id finishes in this process."""
+    with _task_watchers_lock:
+        return _task_watchers.setdefault(task_id, threading.Event())
+
+
+def unwatch_task(task_id):
+    with _task_watchers_lock:
+        _task_watchers.pop(task_id, None)
+
+
+# Status poll responses for unfinished tasks, as (response, read_at). Polls
+# within TASK_STATUS_RECHECK seconds of a read are answered from here; a
+# finish committed in this process (or a Core UPDATE that calls
+# forget_task_status) drops the entry at once, and the recheck bounds how long
+# one committed by another process goes unnoticed. Stale entries are dropped
+# when read, and tasks nobody polls any more age out of the LRU.
+_unfinished_task_statuses = LRUCache(maxsize=config.TASK_STATUS_CACHE_SIZE)
+
+
+def recent_task_status(task_id):
+    """The status response last read for an unfinished task, if still fresh."""
+    entry = _unfinished_task_statuses.get(task_id)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[1] < config.TASK_STATUS_RECHECK:
+        return entry[0]
+    _unfinished_task_statuses.invalidate(task_id)
+    return None
+
+
+def remember_task_status(task_id, response):
+    _unfinished_task_statuses.set(task_id, (response, time.monotonic()))
+
+
+def forget_task_status(task_id):
+    _unfinished_task_statuses.invalidate(task_id)
+
+
+@event.listens_for(Task, "after_insert")
+@event.listens_for(Task, "after_update")
+def _note_finished_task(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.status in FINISHED_TASK_STATUSES:
+        session.info.setdefault("finished_tasks", set()).add(target.id)
+
+
+@event.listens_for(Task, "after_delete")
+def _note_deleted_task(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("deleted_tasks", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_task_watchers(session):
+    for task_id in session.info.pop("deleted_tasks", ()):
+        forget_task_status(task_id)
+    for task_id in session.info.pop("finished_tasks", ()):
+        forget_task_status(task_id)
+        with _task_watchers_lock:
+            watcher = _task_watchers.get(task_id)
+        if watcher:
+            watcher.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_finished_tasks(session):
+    session.info.pop("finished_tasks", None)
+    session.info.pop("deleted_tasks", None)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Use WAL with relaxed fsyncs, memory-mapped reads, a 64 MiB page cache and
+    in-memory temp tables on every connection.
+
+    The WAL file is truncated back to 64 MiB after checkpoints; otherwise it
+    keeps the size of the busiest burst of task and upload commits.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA journal_size_limit=67108864")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
 def init_db(app):
     with app.app_context():
         db.init_app(app)
+        if db.engine.dialect.name == "sqlite":
+            event.listen(db.engine, "connect", _set_sqlite_pragmas)
         from migrations import migrate_database
         migrate_database(app)
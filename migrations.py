@@ -1,4 +1,6 @@
 import logging
+import os
+from datetime import datetime
 
 from sqlalchemy import text, inspect
 
@@ -31,7 +33,17 @@ def get_sqlite_column_type(sqlalchemy_type):
 
 def migrate_database(app):
     """Automatically add missing columns and indexes to existing tables."""
-    from database import db, Folder, PDFFile, Task, Settings
+    from database import (
+        db,
+        Folder,
+        PDFFile,
+        PDFElement,
+        Task,
+        SummaryCache,
+        TranscriptCache,
+        ChatResponseCache,
+        Settings,
+    )
 
     with app.app_context():
         try:
@@ -41,6 +53,10 @@ def migrate_database(app):
             return
 
         existing_tables = set(inspector.get_table_names())
+        # Checked before columns are added, to spot one added just now
+        needs_audio_backfill = "pdf_file" in existing_tables and (
+            "audio_generated_at" not in _get_existing_columns(inspector, "pdf_file")
+        )
         existing_indexes = {}
         for table_name in existing_tables:
             try:
@@ -53,7 +69,11 @@ def migrate_database(app):
         models = [
             ("folder", Folder),
             ("pdf_file", PDFFile),
+            ("pdf_element", PDFElement),
             ("task", Task),
+            ("summary_cache", SummaryCache),
+            ("transcript_cache", TranscriptCache),
+            ("chat_response_cache", ChatResponseCache),
             ("settings", Settings),
         ]
 
@@ -68,9 +88,107 @@ def migrate_database(app):
             except Exception as e:
                 logger.warning(f"Migration failed for table '{table_name}': {e}")
 
+        try:
+            _backfill_pdf_elements(db, PDFFile, PDFElement)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Failed to backfill figure/table elements: {e}")
+
+        try:
+            _relativize_element_paths(db, PDFElement)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Failed to shorten figure image paths: {e}")
+
+        if needs_audio_backfill:
+            try:
+                _backfill_audio_generated_at(db, PDFFile, app)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Failed to backfill podcast audio timestamps: {e}")
+
         logger.info("Database migration completed")
 
 
+def _backfill_pdf_elements(db, PDFFile, PDFElement):
+    """Move elements stored as JSON in pdf_file.figures into pdf_element rows."""
+    from database import pdf_element_rows
+    from utils import fastjson
+
+    legacy_files = (
+        db.session.query(PDFFile.id, PDFFile.figures)
+        .filter(PDFFile.figures.isnot(None), PDFFile.figures != "[]")
+        .all()
+    )
+    if not legacy_files:
+        return
+
+    migrated = 0
+    for file_id, figures in legacy_files:
+        try:
+            elements = fastjson.loads(figures)
+        except ValueError:
+            logger.warning(f"Skipping unreadable figures JSON for file {file_id}")
+            continue
+
+        already_migrated = (
+            db.session.query(PDFElement.id).filter_by(file_id=file_id).first()
+        )
+        rows = pdf_element_rows(file_id, elements or [])
+        if rows and not already_migrated:
+            db.session.execute(db.insert(PDFElement), rows)
+        db.session.query(PDFFile).filter_by(id=file_id).update(
+            {"figures": None}, synchronize_session=False
+        )
+        migrated += 1
+
+    db.session.commit()
+    logger.info(f"Moved figure/table elements for {migrated} files into pdf_element")
+
+
+def _relativize_element_paths(db, PDFElement):
+    """Cut figure paths stored in full down to the image name."""
+    full_paths = (
+        db.session.query(PDFElement.id, PDFElement.path)
+        .filter(PDFElement.path.contains("/"))
+        .all()
+    )
+    if not full_paths:
+        return
+
+    db.session.execute(
+        db.update(PDFElement),
+        [
+            {"id": element_id, "path": os.path.basename(path)}
+            for element_id, path in full_paths
+        ],
+    )
+    db.session.commit()
+    logger.info(f"Stored {len(full_paths)} figure paths relative to their directory")
+
+
+def _backfill_audio_generated_at(db, PDFFile, app):
+    """Set pdf_file.audio_generated_at from the MP3s already on disk."""
+    from utils.audio import get_audio_filename
+
+    audio_folder = app.config["GENERATED_AUDIO_FOLDER"]
+    found = 0
+    for pdf_file in db.session.query(
+        PDFFile.id, PDFFile.filename, PDFFile.storage_name
+    ).all():
+        mp3_filepath = os.path.join(audio_folder, get_audio_filename(pdf_file))
+        if not os.path.exists(mp3_filepath):
+            continue
+        generated_at = datetime.utcfromtimestamp(os.path.getmtime(mp3_filepath))
+        db.session.query(PDFFile).filter_by(id=pdf_file.id).update(
+            {"audio_generated_at": generated_at}, synchronize_session=False
+        )
+        found += 1
+
+    db.session.commit()
+    logger.info(f"Recorded existing podcast audio for {found} files")
+
+
 def _migrate_table_columns(db, table_name, model_class, inspector):
     """Add missing columns to a table."""
 
@@ -1,5 +1,7 @@
 import os
+import re
 import requests
+import threading
 import time
 
 
@@ -7,6 +9,19 @@ import time
 _pubmed_cache = {}
 _pubmed_cache_ttl = 86400  # 24 hours
 
+# One client per Ragflow URL/key, so requests reuse its pooled connections
+# instead of opening a new session (and TLS handshake) every call
+_client_cache = {}
+_client_cache_lock = threading.Lock()
+
+# Idle connections kept to Ragflow. requests keeps 10 by default, fewer than
+# the request threads and background jobs that can call Ragflow at once, so
+# connections beyond that were closed after each call instead of reused
+RAGFLOW_MAX_CONNECTIONS = 32
+
+# "Title Here - PMC12345678.md" -> title (group 1) and PMC ID (group 2)
+PMC_FILENAME_RE = re.compile(r"^(.+?)\s*-\s*PMC(\d+)(?:\(\d+\))?\.md$")
+
 
 # Ragflow API Client
 class RagflowClient:
@@ -15,6 +30,11 @@ class RagflowClient:
         self.api_key = api_key
         self.allowed_datasets = allowed_datasets or []
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=RAGFLOW_MAX_CONNECTIONS
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.session.headers.update(
             {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         )
@@ -74,8 +94,6 @@ class RagflowClient:
 
     def _enrich_documents(self, docs):
         """Extract title from filename and fetch pubdate from PubMed"""
-        import re
-
         # First pass: extract PMC IDs and prepare docs
         pmc_to_doc = {}
         for doc in docs:
@@ -83,7 +101,7 @@ class RagflowClient:
 
             # Extract title from filename (before " - PMCxxxxx")
             # Format: "Title Here - PMC12345678.md"
-            match = re.match(r"^(.+?)\s*-\s*PMC(\d+)(?:\(\d+\))?\.md$", name)
+            match = PMC_FILENAME_RE.match(name)
             if match:
                 extracted_title = match.group(1).strip()
                 pmc_id = match.group(2)
@@ -244,6 +262,16 @@ class RagflowClient:
 
         return sorted(docs, key=get_date, reverse=True)
 
+    def document_exists(self, dataset_id, document_id):
+        """Check that a document is still present in a dataset."""
+        try:
+            result = self.request(
+                "GET", f"/datasets/{dataset_id}/documents?id={document_id}"
+            )
+        except Exception:
+            return False
+        return bool(result.get("data", {}).get("docs"))
+
     def get_document_chunks(self, dataset_id, document_id, page=1, size=100):
         """Get all chunks from a document for importing"""
         result = self.request(
@@ -313,4 +341,11 @@ def get_ragflow_client(settings):
     if not url or not api_key:
         return None
 
-    return RagflowClient(url, api_key, allowed_datasets)
+    key = (url, api_key, tuple(allowed_datasets))
+    with _client_cache_lock:
+        client = _client_cache.get(key)
+        if client is None:
+            # Settings changes leave old clients behind; keep only the current
+            _client_cache.clear()
+            client = _client_cache[key] = RagflowClient(url, api_key, allowed_datasets)
+    return client
@@ -1,10 +1,16 @@
-import json
-
 from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import SQLAlchemyError
 
-from database import db, PDFFile, get_settings
+from database import db, get_pdf_file_or_404, get_settings, release_connection
 from ragflow_service import get_ragflow_client
-from tasks.workers import _get_document_content
+from services import generate_chat_completion
+from tasks.workers import (
+    _get_document_content,
+    _chat_request_hash,
+    _get_cached_chat_response,
+    _cache_chat_response,
+)
+from utils import fastjson
 
 MAX_CHAT_HISTORY = 20
 
@@ -14,7 +20,7 @@ def create_chat_bp(app):
 
     @bp.route("/chat/<int:file_id>", methods=["POST"])
     def chat_with_file(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         data = request.get_json()
         if not data or "message" not in data:
             return jsonify({"error": "Message is required in the request body."}), 400
@@ -23,7 +29,7 @@ def create_chat_bp(app):
         use_ragflow = data.get("use_ragflow", False)
         ragflow_dataset_id = data.get("ragflow_dataset_id")
 
-        history = json.loads(pdf_file.chat_history or "[]")
+        history = fastjson.loads(pdf_file.chat_history or "[]")
 
         if not hasattr(app, "text_client") or not app.text_client:
             return jsonify(
@@ -37,6 +43,9 @@ def create_chat_bp(app):
 
         system_prompt = "You are a helpful research assistant. Your task is to answer questions based on the provided document content."
 
+        # Ragflow and the model can take seconds; don't hold a connection
+        release_connection()
+
         ragflow_context = ""
         if use_ragflow:
             try:
@@ -65,24 +74,20 @@ def create_chat_bp(app):
                                         for c in chunks[:5]
                                     ]
                                 )
-                                system_prompt += " You may also use relevant context from the attached knowledge base to provide better answers."
             except Exception as e:
                 app.logger.warning(f"Ragflow retrieval failed: {e}")
 
         try:
+            # The system prompt and document come first and are the same on
+            # every turn, so the provider can reuse its cached prefix; only
+            # the history and the question (with any Ragflow context) change
             messages = [{"role": "system", "content": system_prompt}]
 
             document_content = _get_document_content(pdf_file, get_settings())
-            context_parts = [f"Document content:\n{document_content}"]
-            if ragflow_context:
-                context_parts.append(ragflow_context)
-
-            context_section = "\n\n---\n\n".join(context_parts)
-
             messages.append(
                 {
                     "role": "user",
-                    "content": f"{context_section}\n\n---\n\nPlease answer questions about this document.",
+                    "content": f"Document content:\n{document_content}\n\n---\n\nPlease answer questions about this document.",
                 }
             )
 
@@ -94,13 +99,31 @@ def create_chat_bp(app):
                     {"role": role, "content": msg.get("parts", [{}])[0].get("text", "")}
                 )
 
-            messages.append({"role": "user", "content": question})
-
-            response = app.text_client.chat.completions.create(
-                model=model_name, messages=messages
-            )
-
-            response_text = response.choices[0].message.content
+            if ragflow_context:
+                messages.append(
+                    {
+                        "role": "user",
+                        "content": f"{ragflow_context}\n\n---\n\nYou may also use the related context above to answer:\n{question}",
+                    }
+                )
+            else:
+                messages.append({"role": "user", "content": question})
+
+            request_hash = _chat_request_hash(model_name, messages)
+            response_text = _get_cached_chat_response(request_hash)
+            if response_text is None:
+                response_text = generate_chat_completion(
+                    app.text_client, model_name, messages
+                )
+                # The reply is already paid for; failing to cache it must not
+                # lose it or the history below
+                try:
+                    _cache_chat_response(request_hash, response_text)
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    app.logger.warning(
+                        f"Could not cache chat reply for file_id {file_id}: {e}"
+                    )
 
             history.append({"role": "user", "parts": [{"text": question}]})
             history.append({"role": "model", "parts": [{"text": response_text}]})
@@ -108,7 +131,7 @@ def create_chat_bp(app):
             if len(history) > MAX_CHAT_HISTORY * 2:
                 history = history[-(MAX_CHAT_HISTORY * 2) :]
 
-            pdf_file.chat_history = json.dumps(history)
+            pdf_file.chat_history = fastjson.dumps(history)
             db.session.commit()
 
             return jsonify(
@@ -1,30 +1,92 @@
 import os
-import json
+import re
+import secrets
+import shutil
 import uuid
-import threading
-
-from flask import Blueprint, request, redirect, url_for, jsonify, render_template
+from urllib.parse import unquote
+
+from flask import (
+    Blueprint,
+    request,
+    redirect,
+    url_for,
+    jsonify,
+    render_template,
+    abort,
+)
 from werkzeug.utils import secure_filename
 
-from database import db, PDFFile, Folder, Task, get_settings
-from services import process_pdf, allowed_file, init_tts_client, init_text_client
+from database import (
+    db,
+    PDFFile,
+    PDFElement,
+    Folder,
+    Task,
+    get_pdf_file_or_404,
+    get_settings,
+    invalidate_pdf_file_cache,
+    library_tags_cache,
+    new_storage_name,
+    pdf_element_dicts,
+    pdf_storage_stem,
+)
+from services import allowed_file, figure_dir_path, init_tts_client, init_text_client
 from ragflow_service import get_ragflow_client
-from tasks.workers import _run_summary_generation, _get_document_content
+from tasks.workers import (
+    _run_summary_generation,
+    _run_pdf_processing,
+    _run_pdf_batch,
+    _get_document_content,
+    run_in_background,
+)
+from routes.generation import task_status_response
+from utils import fastjson
+from utils.cache import (
+    document_content_cache,
+    document_content_key,
+    pdf_elements_cache,
+)
+from utils.audio import get_audio_filename
+from utils.task_queue import TaskStatus
+from utils.uploads import (
+    PART_PREFIX,
+    hash_file,
+    remove_stale_parts,
+    save_stream,
+    save_upload,
+    write_stream_at,
+)
+
+# Server-issued id of a resumable upload, and the byte range each chunk covers
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
 
 
 def get_all_tags():
     """Get all unique tags from all files."""
-    all_files = PDFFile.query.filter(PDFFile.tags.isnot(None)).all()
+    cache = library_tags_cache()
+    all_tags = cache.get("all")
+    if all_tags is not None:
+        return all_tags
+
+    # Only the tags column is needed; loading whole rows would pull in text
+    rows = db.session.query(PDFFile.tags).filter(PDFFile.tags.isnot(None)).all()
     tags_set = set()
-    for f in all_files:
-        if f.tags:
+    for (file_tags,) in rows:
+        if file_tags:
             try:
-                tags = json.loads(f.tags)
+                tags = fastjson.loads(file_tags)
                 if isinstance(tags, list):
                     tags_set.update(tags)
             except:
                 pass
-    return sorted(list(tags_set))
+    all_tags = sorted(list(tags_set))
+    cache.set("all", all_tags)
+    return all_tags
+
+
+def _non_empty(column):
+    return db.and_(column.isnot(None), column != "")
 
 
 def create_files_bp(app):
@@ -40,9 +102,17 @@ def create_files_bp(app):
         search_query = request.args.get("search", "").strip()
         filter_tag = request.args.get("tag", "").strip()
         filter_dataset = request.args.get("dataset", "").strip()
-        current_file = PDFFile.query.get(file_id) if file_id else None
 
-        query = PDFFile.query
+        # The library list only needs names and status flags, so leave the
+        # large text columns out of its rows
+        query = PDFFile.query.options(
+            db.defer(PDFFile.text),
+            db.defer(PDFFile.summary),
+            db.defer(PDFFile.transcript),
+            db.defer(PDFFile.chat_history),
+            db.with_expression(PDFFile.has_summary, _non_empty(PDFFile.summary)),
+            db.with_expression(PDFFile.has_text, _non_empty(PDFFile.text)),
+        )
 
         if search_query:
             query = query.filter(
@@ -64,35 +134,42 @@ def create_files_bp(app):
         )
         all_files = pagination.items
 
-        from utils.audio import get_audio_filename
+        # Loaded after the list so a listed file keeps its status flags
+        current_file = PDFFile.query.get(file_id) if file_id else None
+        if current_file in all_files:
+            # Its text columns were deferred by the list query; load the ones
+            # the page shows together instead of one query per attribute
+            db.session.refresh(current_file, ["text", "summary", "transcript"])
 
-        audio_folder = app.config["GENERATED_AUDIO_FOLDER"]
+        # audio_generated_at is kept in step with the MP3, so no stat per row
         for file in all_files:
-            mp3_filename = get_audio_filename(file)
-            mp3_filepath = os.path.join(audio_folder, mp3_filename)
-            file.audio_exists = os.path.exists(mp3_filepath)
-            file.audio_filename = mp3_filename
+            file.audio_exists = file.audio_generated_at is not None
+            file.audio_filename = get_audio_filename(file)
 
         if current_file:
-            mp3_filename = get_audio_filename(current_file)
-            mp3_filepath = os.path.join(
-                app.config["GENERATED_AUDIO_FOLDER"], mp3_filename
-            )
-            current_file.audio_exists = os.path.exists(mp3_filepath)
-            current_file.audio_filename = mp3_filename
+            current_file.audio_exists = current_file.audio_generated_at is not None
+            current_file.audio_filename = get_audio_filename(current_file)
 
         all_tags = get_all_tags()
 
-        dataset_groups = (
-            db.session.query(PDFFile.ragflow_dataset_name, db.func.count(PDFFile.id))
-            .filter(PDFFile.ragflow_dataset_name.isnot(None))
-            .group_by(PDFFile.ragflow_dataset_name)
+        # Dataset filter counts and the uncategorized count from one query
+        uncategorized = PDFFile.ragflow_dataset_id.is_(None)
+        dataset_counts = {}
+        uncategorized_count = 0
+        for dataset_name, is_uncategorized, count in (
+            db.session.query(
+                PDFFile.ragflow_dataset_name, uncategorized, db.func.count(PDFFile.id)
+            )
+            .group_by(PDFFile.ragflow_dataset_name, uncategorized)
             .all()
-        )
-
-        uncategorized_count = PDFFile.query.filter(
-            PDFFile.ragflow_dataset_id.is_(None)
-        ).count()
+        ):
+            if dataset_name is not None:
+                dataset_counts[dataset_name] = (
+                    dataset_counts.get(dataset_name, 0) + count
+                )
+            if is_uncategorized:
+                uncategorized_count += count
+        dataset_groups = sorted(dataset_counts.items())
 
         return render_template(
             "index.html",
@@ -109,45 +186,6 @@ def create_files_bp(app):
             uncategorized_count=uncategorized_count,
         )
 
-        if filter_tag:
-            query = query.filter(PDFFile.tags.ilike(f'%"{filter_tag}"%'))
-
-        pagination = query.order_by(PDFFile.id.desc()).paginate(
-            page=page, per_page=FILES_PER_PAGE, error_out=False
-        )
-        all_files = pagination.items
-
-        from utils.audio import get_audio_filename
-
-        audio_folder = app.config["GENERATED_AUDIO_FOLDER"]
-        for file in all_files:
-            mp3_filename = get_audio_filename(file)
-            mp3_filepath = os.path.join(audio_folder, mp3_filename)
-            file.audio_exists = os.path.exists(mp3_filepath)
-            file.audio_filename = mp3_filename
-
-        if current_file:
-            mp3_filename = get_audio_filename(current_file)
-            mp3_filepath = os.path.join(
-                app.config["GENERATED_AUDIO_FOLDER"], mp3_filename
-            )
-            current_file.audio_exists = os.path.exists(mp3_filepath)
-            current_file.audio_filename = mp3_filename
-
-        all_tags = get_all_tags()
-
-        return render_template(
-            "index.html",
-            all_files=all_files,
-            current_file=current_file,
-            auto_generate=generate,
-            pagination=pagination,
-            current_page=page,
-            search_query=search_query,
-            filter_tag=filter_tag,
-            all_tags=all_tags,
-        )
-
     @bp.route("/upload", methods=["POST"])
     def upload_file():
         if "file" not in request.files:
@@ -165,136 +203,358 @@ def create_files_bp(app):
                 )
             )
 
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
-
-        try:
-            settings = get_settings()
-            client = get_ragflow_client(settings)
-            if not client:
-                return redirect(
-                    url_for(
-                        "files.index",
-                        error="Ragflow not configured. Please set up Ragflow in settings.",
-                    )
+        # Checked before the upload is written so a misconfigured server
+        # doesn't save the whole PDF only to delete it again
+        if not get_ragflow_client(get_settings()):
+            return redirect(
+                url_for(
+                    "files.index",
+                    error="Ragflow not configured. Please set up Ragflow in settings.",
                 )
+            )
 
-            text, elements_json, _ = process_pdf(filepath)
-
-            markdown_content = f"# {filename}\n\n{text}"
-            temp_md = f"/tmp/{filename.rsplit('.', 1)[0]}.md"
-            with open(temp_md, "w") as f:
-                f.write(markdown_content)
+        filename = secure_filename(file.filename)
+        filepath = stored_pdf_path(new_storage_name())
+        content_hash = save_upload(file, filepath)
+        return queue_pdf_processing(filepath, filename, ragflow_dataset, content_hash)
+
+    @bp.route("/upload_stream", methods=["POST"])
+    def upload_stream():
+        """
+        Upload one PDF sent as the raw request body, named by the
+        URL-encoded X-Filename header.
+
+        No multipart parsing: the body is copied to disk a chunk at a time.
+        """
+        filename, ragflow_dataset, error = raw_upload_target()
+        if error:
+            return error
+
+        filepath = stored_pdf_path(new_storage_name())
+        content_hash = save_stream(request.stream, filepath)
+        return queue_pdf_processing(filepath, filename, ragflow_dataset, content_hash)
+
+    def upload_part_path(upload_id):
+        return os.path.join(
+            app.config["UPLOAD_FOLDER"], f"{PART_PREFIX}{upload_id}.part"
+        )
 
-            result = client.request(
-                "POST",
-                f"/datasets/{ragflow_dataset}/documents",
-                files={"file": open(temp_md, "rb")},
+    @bp.route("/upload_chunk", methods=["POST"])
+    def start_chunked_upload():
+        """
+        Start a resumable upload and return the id its chunks are sent to.
+
+        The id is random and only ids issued here (whose part file exists)
+        are accepted, so clients cannot pick or guess one another's.
+        """
+        _, _, error = raw_upload_target()
+        if error:
+            return error
+        remove_stale_parts(
+            app.config["UPLOAD_FOLDER"], app.config["UPLOAD_PART_MAX_AGE"]
+        )
+        upload_id = secrets.token_hex(16)
+        open(upload_part_path(upload_id), "xb").close()
+        return jsonify({"upload_id": upload_id}), 201
+
+    @bp.route("/upload_chunk/<upload_id>", methods=["GET", "POST"])
+    def upload_chunk(upload_id):
+        """
+        Resumable upload: each POST carries the part of the raw PDF given by
+        its Content-Range header, and upload_id is the id issued by
+        start_chunked_upload.
+
+        Until the last byte arrives the reply is 308 with how much has been
+        received (also what GET returns), so after a dropped connection the
+        client sends the rest rather than starting over.
+        """
+        part_path = upload_part_path(upload_id)
+        # Unknown, finished or expired uploads have no part file
+        if not UPLOAD_ID_RE.match(upload_id) or not os.path.exists(part_path):
+            abort(404)
+        received = os.path.getsize(part_path)
+        if request.method == "GET":
+            return jsonify({"received": received})
+
+        filename, ragflow_dataset, error = raw_upload_target()
+        if error:
+            return error
+        match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return (
+                jsonify({"error": "Expected Content-Range: bytes start-end/total"}),
+                400,
+            )
+        start, end, total = (int(value) for value in match.groups())
+        if start > end or end >= total:
+            return jsonify({"error": "Invalid Content-Range"}), 400
+        # The body is read up to Content-Length, so a matching header means
+        # the chunk is exactly the range it claims
+        if request.content_length != end - start + 1:
+            return jsonify({"error": "Body length does not match Content-Range"}), 400
+        max_length = app.config["MAX_CONTENT_LENGTH"]
+        if max_length and total > max_length:
+            abort(413)
+
+        # A chunk past what's on disk would leave a hole; point the client
+        # back at the first missing byte instead
+        if start <= received:
+            received = write_stream_at(request.stream, part_path, start)
+        if received > total:
+            os.remove(part_path)
+            return (
+                jsonify({"error": "Upload is larger than Content-Range total"}),
+                400,
             )
-            os.remove(temp_md)
+        if received < total:
+            response = jsonify({"received": received})
+            response.status_code = 308
+            if received:
+                response.headers["Range"] = f"bytes=0-{received - 1}"
+            return response
+
+        filepath = stored_pdf_path(new_storage_name())
+        os.replace(part_path, filepath)
+        return queue_pdf_processing(
+            filepath, filename, ragflow_dataset, hash_file(filepath)
+        )
 
-            ragflow_document_id = result.get("data", {}).get("document", {}).get("id")
-            if not ragflow_document_id:
-                app.logger.error(
-                    f"Ragflow upload response missing document ID: {result}"
-                )
-                return redirect(
-                    url_for(
-                        "files.index", error="Failed to get document ID from Ragflow"
-                    )
-                )
+    def raw_upload_target():
+        """
+        Filename and Ragflow dataset from a raw upload's headers, or an error
+        response if either is missing or Ragflow isn't set up.
+        """
+        filename = secure_filename(unquote(request.headers.get("X-Filename", "")))
+        ragflow_dataset = request.headers.get("X-Ragflow-Dataset")
+        if not filename or not allowed_file(filename):
+            error = "Only PDF files are supported"
+        elif not ragflow_dataset:
+            error = "Please select a Ragflow dataset to upload to"
+        elif not get_ragflow_client(get_settings()):
+            error = "Ragflow not configured. Please set up Ragflow in settings."
+        else:
+            return filename, ragflow_dataset, None
+        return None, None, (jsonify({"error": error}), 400)
+
+    def queue_pdf_processing(filepath, filename, ragflow_dataset, content_hash):
+        """Record a task for a saved upload and process it in the background."""
+        # PDF extraction and the Ragflow upload run in the background
+        task_id = str(uuid.uuid4())
+        new_task = Task(id=task_id, status=TaskStatus.PROCESSING)
+        db.session.add(new_task)
+        db.session.commit()
 
-            dataset_info = client.get_dataset(ragflow_dataset)
-            ragflow_dataset_name = dataset_info.get("name", "Unknown Dataset")
-
-            new_file = PDFFile(
-                filename=filename,
-                text=None,
-                figures=elements_json,
-                captions=json.dumps([]),
-                ragflow_document_id=ragflow_document_id,
-                ragflow_dataset_id=ragflow_dataset,
-                ragflow_dataset_name=ragflow_dataset_name,
-            )
-            db.session.add(new_file)
-            db.session.commit()
+        run_in_background(
+            _run_pdf_processing,
+            app,
+            task_id,
+            filepath,
+            filename,
+            ragflow_dataset,
+            content_hash,
+        )
 
-            os.remove(filepath)
+        return jsonify({"task_id": task_id}), 202
 
-            return redirect(
-                url_for("files.index", file=new_file.id, generate="summary")
+    @bp.route("/upload_batch", methods=["POST"])
+    def upload_batch():
+        """Upload several PDFs at once; returns one task id per accepted file."""
+        ragflow_dataset = request.form.get("ragflow_dataset")
+        if not ragflow_dataset:
+            return jsonify({"error": "Please select a Ragflow dataset to upload to"}), 400
+
+        if not get_ragflow_client(get_settings()):
+            return (
+                jsonify(
+                    {"error": "Ragflow not configured. Please set up Ragflow in settings."}
+                ),
+                400,
             )
 
-        except Exception as e:
-            app.logger.error(f"Failed to upload to Ragflow: {e}")
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return redirect(url_for("files.index", error=f"Failed to upload: {str(e)}"))
+        jobs = []
+        skipped = []
+        seen = set()
+        for file in request.files.getlist("files"):
+            filename = secure_filename(file.filename or "")
+            if not filename or not allowed_file(filename) or filename in seen:
+                skipped.append(file.filename)
+                continue
+            seen.add(filename)
+            filepath = stored_pdf_path(new_storage_name())
+            content_hash = save_upload(file, filepath)
+            jobs.append((str(uuid.uuid4()), filepath, filename, content_hash))
+
+        if not jobs:
+            return jsonify({"error": "No PDF files to upload", "skipped": skipped}), 400
+
+        # One commit for the whole batch instead of one per file
+        db.session.add_all(
+            Task(id=task_id, status=TaskStatus.PROCESSING) for task_id, *_ in jobs
+        )
+        db.session.commit()
+
+        # Only a couple of files are processed at a time; each extraction
+        # already spreads its pages over the process pool
+        run_in_background(_run_pdf_batch, app, jobs, ragflow_dataset)
+
+        return (
+            jsonify(
+                {
+                    "task_ids": [task_id for task_id, *_ in jobs],
+                    "skipped": skipped,
+                }
+            ),
+            202,
+        )
+
+    @bp.route("/upload_status/<task_id>")
+    def upload_status(task_id):
+        return task_status_response(task_id)
 
     @bp.route("/file_content/<int:file_id>")
     def file_content(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         audio_url = None
-        from utils.audio import get_audio_filename
-
-        mp3_filename = get_audio_filename(pdf_file)
-        mp3_filepath = os.path.join(app.config["GENERATED_AUDIO_FOLDER"], mp3_filename)
-        if os.path.exists(mp3_filepath):
-            audio_url = url_for("static.generated_audio", filename=mp3_filename)
+        if pdf_file.audio_generated_at:
+            audio_url = url_for(
+                "static.stream_audio", file_id=file_id, v=pdf_file.audio_version
+            )
 
         return {
             "summary": pdf_file.summary,
             "transcript": pdf_file.transcript,
-            "chat_history": json.loads(pdf_file.chat_history or "[]"),
+            "chat_history": fastjson.loads(pdf_file.chat_history or "[]"),
             "audio_url": audio_url,
         }
 
     @bp.route("/file_text/<int:file_id>")
     def file_text(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         text = _get_document_content(pdf_file, get_settings())
         return {"text": text}
 
     @bp.route("/file_details/<int:file_id>")
     def file_details(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
-        elements = json.loads(pdf_file.figures or "[]")
+        # Polled by the figures panel; plain rows skip ORM instance setup
+        file_row = db.session.execute(
+            db.select(PDFFile.id, PDFFile.filename, PDFFile.storage_name).where(
+                PDFFile.id == file_id
+            )
+        ).one_or_none()
+        if file_row is None:
+            abort(404)
+        # Figure paths are stored relative to the file's figure directory
+        figure_url = url_for(
+            "static", filename=f"figures/{pdf_storage_stem(file_row)}"
+        )
+        # Table JSON is parsed and figure paths joined once per file, not on
+        # every click through the panel
+        cached = pdf_elements_cache.get(file_id)
+        if cached is not None and cached[0] == figure_url:
+            elements = cached[1]
+        else:
+            elements = pdf_element_dicts(file_id, figure_url)
+            pdf_elements_cache.set(file_id, (figure_url, elements))
         return jsonify(
-            {"id": pdf_file.id, "filename": pdf_file.filename, "elements": elements}
+            {"id": file_row.id, "filename": file_row.filename, "elements": elements}
         )
 
-    @bp.route("/delete_file/<int:file_id>", methods=["DELETE"])
-    def delete_file(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+    def stored_pdf_path(storage_stem):
+        return os.path.join(app.config["UPLOAD_FOLDER"], f"{storage_stem}.pdf")
+
+    def stored_file_paths(pdf_file):
+        """The uploaded PDF, podcast and figure directory kept for a file."""
+        storage_stem = pdf_storage_stem(pdf_file)
+        return [
+            stored_pdf_path(storage_stem),
+            os.path.join(
+                app.config["GENERATED_AUDIO_FOLDER"], get_audio_filename(pdf_file)
+            ),
+            figure_dir_path(storage_stem),
+        ]
+
+    def forget_cached_content(pdf_file):
+        if pdf_file.ragflow_dataset_id and pdf_file.ragflow_document_id:
+            document_content_cache.invalidate(
+                document_content_key(
+                    pdf_file.ragflow_dataset_id, pdf_file.ragflow_document_id
+                )
+            )
+        pdf_elements_cache.invalidate(pdf_file.id)
 
-        pdf_path = os.path.join(app.config["UPLOAD_FOLDER"], pdf_file.filename)
-        from utils.audio import get_audio_filename
+    def remove_stored_files(paths):
+        """Unlink files off the request thread; the rows are already gone."""
 
-        mp3_filename = get_audio_filename(pdf_file)
-        mp3_filepath = os.path.join(app.config["GENERATED_AUDIO_FOLDER"], mp3_filename)
+        def remove():
+            for path in paths:
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                    app.logger.info(f"Deleted stored file: {path}")
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    app.logger.error(f"Error deleting stored file {path}: {e}")
+
+        run_in_background(remove)
+
+    @bp.route("/delete_file/<int:file_id>", methods=["DELETE"])
+    def delete_file(file_id):
+        pdf_file = get_pdf_file_or_404(file_id)
+        paths = stored_file_paths(pdf_file)
+        forget_cached_content(pdf_file)
 
         db.session.delete(pdf_file)
         db.session.commit()
         app.logger.info(f"Deleted file_id {file_id} from database.")
 
-        try:
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-                app.logger.info(f"Deleted PDF file: {pdf_path}")
-            if os.path.exists(mp3_filepath):
-                os.remove(mp3_filepath)
-                app.logger.info(f"Deleted audio file: {mp3_filepath}")
-        except Exception as e:
-            app.logger.error(
-                f"Error deleting physical files for file_id {file_id}: {e}"
+        remove_stored_files(paths)
+        return {"success": True}
+
+    @bp.route("/delete_files", methods=["POST"])
+    def delete_files():
+        """Delete several files with one DELETE ... WHERE id IN (...)."""
+        file_ids = (request.get_json(silent=True) or {}).get("ids")
+        if not isinstance(file_ids, list) or not all(
+            isinstance(file_id, int) for file_id in file_ids
+        ):
+            return {"error": "ids must be a list of file ids"}, 400
+
+        rows = db.session.execute(
+            db.select(
+                PDFFile.id,
+                PDFFile.filename,
+                PDFFile.storage_name,
+                PDFFile.ragflow_dataset_id,
+                PDFFile.ragflow_document_id,
+            ).where(PDFFile.id.in_(file_ids))
+        ).all()
+        deleted = [row.id for row in rows]
+        if deleted:
+            # Bulk deletes skip the ORM cascade and the cache listeners, so
+            # elements and cached rows are dropped here explicitly
+            db.session.execute(
+                db.delete(PDFElement).where(PDFElement.file_id.in_(deleted))
             )
+            db.session.execute(db.delete(PDFFile).where(PDFFile.id.in_(deleted)))
+            db.session.commit()
+            library_tags_cache().invalidate("all")
+            app.logger.info(f"Deleted file_ids {deleted} from database.")
 
-        return {"success": True}
+        paths = []
+        for row in rows:
+            invalidate_pdf_file_cache(row.id)
+            forget_cached_content(row)
+            paths.extend(stored_file_paths(row))
+        remove_stored_files(paths)
+
+        return {"success": True, "deleted": deleted}
 
     @bp.route("/rename_file/<int:file_id>", methods=["POST"])
     def rename_file(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         new_filename_req = request.json.get("new_filename")
         if not new_filename_req:
             return {"error": "New filename is required"}, 400
@@ -305,87 +565,33 @@ def create_files_bp(app):
             else f"{new_filename_req}.pdf"
         )
 
-        original_filename = pdf_file.filename
-        old_pdf_path = os.path.join(app.config["UPLOAD_FOLDER"], original_filename)
-        new_pdf_path = os.path.join(app.config["UPLOAD_FOLDER"], new_filename)
-
-        if os.path.exists(new_pdf_path):
-            return {"error": "A file with this name already exists"}, 400
-
-        old_fig_dir_basename = os.path.splitext(original_filename)[0]
-        new_fig_dir_basename = os.path.splitext(new_filename)[0]
-        old_fig_dir = os.path.join("static", "figures", old_fig_dir_basename)
-        new_fig_dir = os.path.join("static", "figures", new_fig_dir_basename)
-
-        from sqlalchemy.exc import SQLAlchemyError
+        from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
         try:
-            os.rename(old_pdf_path, new_pdf_path)
-            app.logger.info(f"Renamed PDF {old_pdf_path} to {new_pdf_path}")
-
-            if os.path.isdir(old_fig_dir):
-                os.rename(old_fig_dir, new_fig_dir)
-                app.logger.info(f"Renamed figures dir {old_fig_dir} to {new_fig_dir}")
-
+            # Stored files are named after storage_name, so only the row
+            # changes; older files keep the name they were stored under
+            pdf_file.storage_name = pdf_storage_stem(pdf_file)
             pdf_file.filename = new_filename
-            if pdf_file.figures:
-                figures_list = json.loads(pdf_file.figures)
-                updated_figures = [
-                    p.replace(
-                        f"static/figures/{old_fig_dir_basename}",
-                        f"static/figures/{new_fig_dir_basename}",
-                        1,
-                    )
-                    for p in figures_list
-                ]
-                pdf_file.figures = json.dumps(updated_figures)
-
             db.session.commit()
-            app.logger.info(
-                f"Updated database for file_id {file_id} to new name {new_filename}"
-            )
-
-            return {
-                "success": True,
-                "new_filename": new_filename,
-                "new_url": url_for("static.uploaded_file", filename=new_filename),
-            }
-
-        except (OSError, SQLAlchemyError) as e:
+        except SQLAlchemyError as e:
             db.session.rollback()
-            app.logger.error(
-                f"Error during rename for file_id {file_id}: {e}. Rolling back changes."
-            )
+            if isinstance(e, IntegrityError):
+                return {"error": "A file with this name already exists"}, 400
+            app.logger.error(f"Error during rename for file_id {file_id}: {e}")
+            return {"error": "An error occurred during the rename operation."}, 500
 
-            if os.path.exists(new_pdf_path) and not os.path.exists(old_pdf_path):
-                try:
-                    os.rename(new_pdf_path, old_pdf_path)
-                    app.logger.info(
-                        f"Rolled back PDF rename from {new_pdf_path} to {old_pdf_path}"
-                    )
-                except OSError as rollback_e:
-                    app.logger.critical(
-                        f"CRITICAL: Filesystem rollback failed for PDF. Path: {new_pdf_path}. DB rolled back. Error: {rollback_e}"
-                    )
-
-            if os.path.exists(new_fig_dir) and not os.path.exists(old_fig_dir):
-                try:
-                    os.rename(new_fig_dir, old_fig_dir)
-                    app.logger.info(
-                        f"Rolled back figures dir rename from {new_fig_dir} to {old_fig_dir}"
-                    )
-                except OSError as rollback_e:
-                    app.logger.critical(
-                        f"CRITICAL: Filesystem rollback failed for figures dir. Path: {new_fig_dir}. DB rolled back. Error: {rollback_e}"
-                    )
-
-            return {
-                "error": "An error occurred during the rename operation. All changes have been reverted."
-            }, 500
+        app.logger.info(f"Renamed file_id {file_id} to {new_filename}")
+        return {
+            "success": True,
+            "new_filename": new_filename,
+            "new_url": url_for(
+                "static.uploaded_file", filename=f"{pdf_file.storage_name}.pdf"
+            ),
+        }
 
     @bp.route("/move_file/<int:file_id>", methods=["POST"])
     def move_file(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         new_folder_id = request.json.get("new_folder_id")
 
         if new_folder_id == "root":
@@ -411,7 +617,10 @@ def create_files_bp(app):
     def delete_folder(folder_id):
         folder = Folder.query.get_or_404(folder_id)
 
-        if folder.files:
+        has_files = db.session.query(
+            PDFFile.query.filter_by(folder_id=folder_id).exists()
+        ).scalar()
+        if has_files:
             return {"error": "Cannot delete a folder that is not empty."}, 400
 
         db.session.delete(folder)
@@ -1,113 +1,243 @@
-import json
-import uuid
-import threading
 import os
-import io
 import re
 
-from flask import Blueprint, request, jsonify, Response, stream_with_context, url_for
+from flask import (
+    Blueprint,
+    request,
+    jsonify,
+    Response,
+    abort,
+    stream_with_context,
+    url_for,
+)
 
-from database import db, PDFFile, Task, get_settings
+from database import (
+    db,
+    PDFFile,
+    Task,
+    FINISHED_TASK_STATUSES,
+    forget_task_status,
+    get_pdf_file_or_404,
+    get_settings,
+    recent_task_status,
+    release_connection,
+    remember_task_status,
+    unwatch_task,
+    watch_task,
+)
 from services import (
     generate_text_with_file,
     generate_text_stream,
     generate_voice_sample,
 )
-from pydub import AudioSegment
 from tasks.workers import (
-    _run_summary_generation,
-    _run_transcript_generation,
-    _run_podcast_generation,
     _get_document_content,
+    _get_cached_summary,
+    _cache_summary,
+    _reuse_generation,
 )
-from utils.task_queue import TaskStatus
+from utils import fastjson
+from utils.task_queue import get_task_queue
+
+# Characters replaced in a voice name to name its cached sample MP3
+VOICE_NAME_UNSAFE_RE = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+def _batch_tokens(tokens, full_text_parts, batch_size=50):
+    """
+    Group streamed tokens into chunks of at least batch_size characters so
+    each SSE event carries more than a word, recording every token in
+    full_text_parts for the final "".join().
+    """
+    batch = []
+    batch_len = 0
+    for token in tokens:
+        full_text_parts.append(token)
+        batch.append(token)
+        batch_len += len(token)
+        if batch_len >= batch_size:
+            yield "".join(batch)
+            batch = []
+            batch_len = 0
+    if batch:
+        yield "".join(batch)
+
+
+# Comment lines keep proxies from closing a quiet /task_stream connection
+TASK_STREAM_KEEPALIVE_SECONDS = 15
+
+
+def _task_status_data(task):
+    return {
+        "status": task.status,
+        "result": fastjson.loads(task.result) if task.result else None,
+    }
+
+
+def task_status_response(task_id):
+    """Return a task's status as JSON, deleting the task once it has finished."""
+    # Polled every couple of seconds; a running task's status is only read
+    # again every TASK_STATUS_RECHECK seconds or once its finish is committed
+    response_data = recent_task_status(task_id)
+    if response_data is not None:
+        return jsonify(response_data)
+
+    # Plain rows and a Core DELETE skip ORM instance setup and the unit of work
+    task = db.session.execute(
+        db.select(Task.status, Task.result).where(Task.id == task_id)
+    ).one_or_none()
+    if task is None:
+        abort(404)
+    response_data = _task_status_data(task)
+    if task.status in FINISHED_TASK_STATUSES:
+        db.session.execute(db.delete(Task).where(Task.id == task_id))
+        db.session.commit()
+        forget_task_status(task_id)
+    else:
+        remember_task_status(task_id, response_data)
+    return jsonify(response_data)
+
+
+def task_stream_response(task_id):
+    """
+    Send a task's final status as one server-sent event as soon as it is
+    committed, then delete the task like task_status_response does.
+    """
+    Task.query.get_or_404(task_id)
+
+    def events():
+        finished = watch_task(task_id)
+        try:
+            while True:
+                # Register before reading, so a finish in between still wakes us
+                finished.clear()
+                task = db.session.get(Task, task_id, populate_existing=True)
+                if task is None:
+                    yield f"data: {fastjson.dumps({'status': 'error', 'result': {'error': 'Task not found'}})}\n\n"
+                    return
+                if task.status in FINISHED_TASK_STATUSES:
+                    response_data = _task_status_data(task)
+                    db.session.delete(task)
+                    db.session.commit()
+                    yield f"data: {fastjson.dumps(response_data)}\n\n"
+                    return
+                # Don't keep a transaction open while waiting
+                db.session.rollback()
+                if not finished.wait(TASK_STREAM_KEEPALIVE_SECONDS):
+                    yield ": keepalive\n\n"
+        finally:
+            unwatch_task(task_id)
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 def create_generation_bp(app):
     bp = Blueprint("generation", __name__)
 
-    def _get_task_status_response(task_id):
-        task = Task.query.get_or_404(task_id)
-        response_data = {
-            "status": task.status,
-            "result": json.loads(task.result) if task.result else None,
-        }
-        if task.status in [TaskStatus.COMPLETE.value, TaskStatus.ERROR.value]:
-            db.session.delete(task)
+    def queue_generation(task_type, file_id):
+        """
+        Queue a generation job in the SQLite-backed task queue, which keeps it
+        across restarts, and return the 202 response with its task id. A full
+        queue answers 429 rather than growing without bound.
+
+        Jobs whose result already exists finish here instead, answering 200
+        with the same status data a finished task reports. ?force=1 (sent by
+        the regenerate buttons) always queues a fresh model or TTS call.
+        """
+        pdf_file = get_pdf_file_or_404(file_id)
+        force = request.args.get("force") == "1"
+        result = None
+        if not force:
+            result = _reuse_generation(task_type, pdf_file, get_settings())
+        if result is not None:
             db.session.commit()
-        return jsonify(response_data)
+            return jsonify({"status": "complete", "result": result})
+
+        task_queue = get_task_queue()
+        if task_queue.pending_count() >= app.config["TASK_QUEUE_MAX_PENDING"]:
+            return (
+                jsonify({"error": "Too many jobs are waiting. Try again shortly."}),
+                429,
+            )
+        task_id = task_queue.enqueue(
+            task_type, file_id, metadata={"force": True} if force else None
+        )
+        task_queue.start_workers(app)
+        return jsonify({"task_id": task_id}), 202
 
     @bp.route("/summarize_file/<int:file_id>", methods=["POST"])
     def summarize_file(file_id):
-        task_id = str(uuid.uuid4())
-        new_task = Task(id=task_id, status=TaskStatus.PROCESSING)
-        db.session.add(new_task)
-        db.session.commit()
+        return queue_generation("summary", file_id)
 
-        thread = threading.Thread(
-            target=_run_summary_generation, args=(app, task_id, file_id)
-        )
-        thread.start()
-
-        return jsonify({"task_id": task_id}), 202
+    @bp.route("/task_stream/<task_id>")
+    def task_stream(task_id):
+        return task_stream_response(task_id)
 
     @bp.route("/summarize_status/<task_id>")
     def summarize_status(task_id):
-        return _get_task_status_response(task_id)
+        return task_status_response(task_id)
 
     @bp.route("/summarize_stream/<int:file_id>")
     def summarize_stream(file_id):
-        PDFFile.query.get_or_404(file_id)
+        get_pdf_file_or_404(file_id)
         settings = get_settings()
+        force = request.args.get("force") == "1"
 
         if not hasattr(app, "text_client") or not app.text_client:
             return Response(
-                f"data: {json.dumps({'error': 'Text client not initialized'})}\n\n",
+                f"data: {fastjson.dumps({'error': 'Text client not initialized'})}\n\n",
                 mimetype="text/event-stream",
             )
 
         def generate():
             pdf_file = PDFFile.query.get(file_id)
             if not pdf_file:
-                yield f"data: {json.dumps({'type': 'error', 'error': 'File not found'})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'error', 'error': 'File not found'})}\n\n"
                 return
 
             try:
                 prompt = settings.summary_prompt
                 model_name = settings.summary_model
 
-                yield f"data: {json.dumps({'type': 'start'})}\n\n"
-
-                full_text = ""
-                token_buffer = ""
-                buffer_size = 50
-
-                for token in generate_text_stream(
+                yield f"data: {fastjson.dumps({'type': 'start'})}\n\n"
+
+                cached_summary = None
+                if not force:
+                    cached_summary = _get_cached_summary(pdf_file, settings)
+                if cached_summary:
+                    yield f"data: {fastjson.dumps({'type': 'token', 'content': cached_summary})}\n\n"
+                    pdf_file.summary = cached_summary
+                    db.session.commit()
+                    yield f"data: {fastjson.dumps({'type': 'complete', 'summary': cached_summary[:500]})}\n\n"
+                    return
+
+                release_connection()
+                full_text_parts = []
+                tokens = generate_text_stream(
                     app.text_client,
                     model_name,
                     _get_document_content(pdf_file, settings),
                     prompt,
                     "You are a helpful research assistant that summarizes documents clearly.",
-                ):
-                    full_text += token
-                    token_buffer += token
-                    if len(token_buffer) >= buffer_size:
-                        yield f"data: {json.dumps({'type': 'token', 'content': token_buffer})}\n\n"
-                        token_buffer = ""
-
-                if token_buffer:
-                    yield f"data: {json.dumps({'type': 'token', 'content': token_buffer})}\n\n"
+                )
+                for batch in _batch_tokens(tokens, full_text_parts):
+                    yield f"data: {fastjson.dumps({'type': 'token', 'content': batch})}\n\n"
 
+                full_text = "".join(full_text_parts)
                 pdf_file.summary = full_text
+                _cache_summary(pdf_file, settings, full_text)
                 db.session.commit()
 
-                yield f"data: {json.dumps({'type': 'complete', 'summary': full_text[:500]})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'complete', 'summary': full_text[:500]})}\n\n"
 
             except Exception as e:
                 import traceback
 
                 error_detail = str(e) + "\n" + traceback.format_exc()
-                yield f"data: {json.dumps({'type': 'error', 'error': error_detail})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'error', 'error': error_detail})}\n\n"
 
         response = Response(
             stream_with_context(generate()), mimetype="text/event-stream"
@@ -118,36 +248,26 @@ def create_generation_bp(app):
 
     @bp.route("/generate_transcript/<int:file_id>", methods=["POST"])
     def generate_transcript(file_id):
-        task_id = str(uuid.uuid4())
-        new_task = Task(id=task_id, status=TaskStatus.PROCESSING)
-        db.session.add(new_task)
-        db.session.commit()
-
-        thread = threading.Thread(
-            target=_run_transcript_generation, args=(app, task_id, file_id)
-        )
-        thread.start()
-
-        return jsonify({"task_id": task_id}), 202
+        return queue_generation("transcript", file_id)
 
     @bp.route("/transcript_status/<task_id>")
     def transcript_status(task_id):
-        return _get_task_status_response(task_id)
+        return task_status_response(task_id)
 
     @bp.route("/transcript_stream/<int:file_id>")
     def transcript_stream(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         settings = get_settings()
 
         if not pdf_file.summary:
             return Response(
-                f"data: {json.dumps({'type': 'error', 'error': 'No summary available. Generate summary first.'})}\n\n",
+                f"data: {fastjson.dumps({'type': 'error', 'error': 'No summary available. Generate summary first.'})}\n\n",
                 mimetype="text/event-stream",
             )
 
         if not hasattr(app, "text_client") or not app.text_client:
             return Response(
-                f"data: {json.dumps({'type': 'error', 'error': 'Text client not initialized'})}\n\n",
+                f"data: {fastjson.dumps({'type': 'error', 'error': 'Text client not initialized'})}\n\n",
                 mimetype="text/event-stream",
             )
 
@@ -156,38 +276,31 @@ def create_generation_bp(app):
                 prompt = settings.transcript_prompt
                 model_name = settings.transcript_model
 
-                yield f"data: {json.dumps({'type': 'start'})}\n\n"
-
-                full_text = ""
-                token_buffer = ""
-                buffer_size = 50
+                yield f"data: {fastjson.dumps({'type': 'start'})}\n\n"
 
-                for token in generate_text_stream(
+                release_connection()
+                full_text_parts = []
+                tokens = generate_text_stream(
                     app.text_client,
                     model_name,
                     pdf_file.summary,
                     prompt,
                     "You are a helpful research assistant that creates engaging podcast scripts from documents.",
-                ):
-                    full_text += token
-                    token_buffer += token
-                    if len(token_buffer) >= buffer_size:
-                        yield f"data: {json.dumps({'type': 'token', 'content': token_buffer})}\n\n"
-                        token_buffer = ""
-
-                if token_buffer:
-                    yield f"data: {json.dumps({'type': 'token', 'content': token_buffer})}\n\n"
+                )
+                for batch in _batch_tokens(tokens, full_text_parts):
+                    yield f"data: {fastjson.dumps({'type': 'token', 'content': batch})}\n\n"
 
+                full_text = "".join(full_text_parts)
                 pdf_file.transcript = full_text
                 db.session.commit()
 
-                yield f"data: {json.dumps({'type': 'complete', 'transcript': full_text[:500]})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'complete', 'transcript': full_text[:500]})}\n\n"
 
             except Exception as e:
                 import traceback
 
                 error_msg = str(e) + "\n" + traceback.format_exc()
-                yield f"data: {json.dumps({'type': 'error', 'error': error_msg})}\n\n"
+                yield f"data: {fastjson.dumps({'type': 'error', 'error': error_msg})}\n\n"
 
         response = Response(
             stream_with_context(generate()), mimetype="text/event-stream"
@@ -198,29 +311,23 @@ def create_generation_bp(app):
 
     @bp.route("/generate_podcast/<int:file_id>", methods=["POST"])
     def generate_podcast(file_id):
-        task_id = str(uuid.uuid4())
-        new_task = Task(id=task_id, status=TaskStatus.PROCESSING)
-        db.session.add(new_task)
-        db.session.commit()
-        thread = threading.Thread(
-            target=_run_podcast_generation, args=(app, task_id, file_id)
-        )
-        thread.start()
-        return jsonify({"task_id": task_id}), 202
+        return queue_generation("podcast", file_id)
 
     @bp.route("/podcast_status/<task_id>")
     def podcast_status(task_id):
-        return _get_task_status_response(task_id)
+        return task_status_response(task_id)
 
     @bp.route("/save_transcript/<int:file_id>", methods=["POST"])
     def save_transcript(file_id):
-        pdf_file = PDFFile.query.get_or_404(file_id)
+        pdf_file = get_pdf_file_or_404(file_id)
         data = request.get_json()
 
         if not data or "transcript" not in data:
             return jsonify({"error": "Transcript is required"}), 400
 
         pdf_file.transcript = data["transcript"]
+        # The MP3 no longer matches and is removed below
+        pdf_file.audio_generated_at = None
         db.session.commit()
 
         from utils.audio import get_audio_filename
@@ -253,7 +360,7 @@ def create_generation_bp(app):
         samples_folder = os.path.join(app.config["GENERATED_AUDIO_FOLDER"], "samples")
         os.makedirs(samples_folder, exist_ok=True)
 
-        safe_filename = re.sub(r"[^a-zA-Z0-9_-]", "_", voice)
+        safe_filename = VOICE_NAME_UNSAFE_RE.sub("_", voice)
         mp3_filename = f"{safe_filename}.mp3"
         mp3_filepath = os.path.join(samples_folder, mp3_filename)
 
@@ -265,8 +372,9 @@ def create_generation_bp(app):
                     app.tts_client, voice, sample_text
                 )
 
-                audio = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
-                audio.export(mp3_filepath, format="mp3")
+                # DeepInfra already returns MP3, so store it as-is
+                with open(mp3_filepath, "wb") as f:
+                    f.write(audio_data)
                 app.logger.info(f"Saved voice sample to {mp3_filepath}")
 
             except Exception as e:
@@ -1,15 +1,14 @@
-import json
 import os
 import uuid
-import threading
 
 from flask import Blueprint, request, jsonify, render_template
 
-from database import db, PDFFile, Task, get_settings
+from database import db, PDFFile, Task, get_settings, new_storage_name
 from ragflow_service import get_ragflow_client
+from utils import fastjson
 from utils.cache import ragflow_cache
 from utils.task_queue import TaskQueue, TaskStatus
-from tasks.workers import _run_summary_generation
+from tasks.workers import _run_summary_generation, run_in_background
 
 
 def create_ragflow_bp(app):
@@ -180,6 +179,7 @@ def create_ragflow_bp(app):
             # Create new file with Ragflow references ONLY (no local content)
             new_file = PDFFile(
                 filename=doc_name,
+                storage_name=new_storage_name(),
                 text=None,  # Don't store locally - fetch on demand
                 figures="[]",
                 captions="[]",
@@ -196,10 +196,7 @@ def create_ragflow_bp(app):
             db.session.add(new_task)
             db.session.commit()
 
-            thread = threading.Thread(
-                target=_run_summary_generation, args=(app, task_id, new_file.id)
-            )
-            thread.start()
+            run_in_background(_run_summary_generation, app, task_id, new_file.id)
 
             ragflow_cache.invalidate(f"docs_{dataset_id}_all")
 
@@ -299,6 +296,7 @@ def create_ragflow_bp(app):
                 # Create new file
                 new_file = PDFFile(
                     filename=doc_name,
+                    storage_name=new_storage_name(),
                     text=None,
                     figures="[]",
                     captions="[]",
@@ -324,7 +322,7 @@ def create_ragflow_bp(app):
                     new_task = Task(
                         id=task_id,
                         status=TaskStatus.PENDING,
-                        result=json.dumps(
+                        result=fastjson.dumps(
                             {
                                 "task_type": "summary",
                                 "file_id": new_file.id,
@@ -367,7 +365,7 @@ def create_ragflow_bp(app):
         if not task:
             return jsonify({"error": "Task not found"}), 404
 
-        task_data = json.loads(task.result) if task.result else {}
+        task_data = fastjson.loads(task.result) if task.result else {}
 
         return jsonify(
             {
@@ -392,21 +390,21 @@ def create_ragflow_bp(app):
             filtered = [
                 t
                 for t in all_tasks
-                if json.loads(t.result or "{}").get("file_id") == file_id
+                if fastjson.loads(t.result or "{}").get("file_id") == file_id
             ]
         elif batch_id:
             all_tasks = Task.query.order_by(Task.id.desc()).limit(200).all()
             filtered = [
                 t
                 for t in all_tasks
-                if json.loads(t.result or "{}").get("batch_id") == batch_id
+                if fastjson.loads(t.result or "{}").get("batch_id") == batch_id
             ]
         else:
             filtered = Task.query.order_by(Task.id.desc()).limit(50).all()
 
         result = []
         for task in filtered:
-            task_data = json.loads(task.result) if task.result else {}
+            task_data = fastjson.loads(task.result) if task.result else {}
             result.append(
                 {
                     "id": task.id,
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, redirect, url_for, render_template, flash
 
-from database import db, get_settings
+from database import db, get_settings, invalidate_settings_cache
 from services import (
     SUMMARY_MODEL,
     TRANSCRIPT_MODEL,
@@ -8,9 +8,9 @@ from services import (
     TTS_HOST_VOICE,
     TTS_MODEL,
     TTS_EXPERT_VOICE,
-    available_voices,
     init_tts_client,
     init_text_client,
+    model_catalog,
 )
 
 
@@ -59,6 +59,7 @@ def create_settings_bp(app):
                 s.gemini_api_key = api_key_gemini
 
             db.session.commit()
+            invalidate_settings_cache()
             init_tts_client(app)
             init_text_client(app)
 
@@ -67,12 +68,13 @@ def create_settings_bp(app):
             flash("Settings saved successfully!", "success")
             return redirect(url_for("settings.settings"))
 
+        catalog = model_catalog(app)
         return render_template(
             "settings.html",
             settings=s,
-            text_models=[SUMMARY_MODEL, TRANSCRIPT_MODEL, CHAT_MODEL],
-            tts_models=[TTS_MODEL],
-            voices=available_voices,
+            text_models=catalog["text"],
+            tts_models=catalog["tts"],
+            voices=catalog["voices"],
         )
 
     return bp
@@ -1,15 +1,93 @@
-from flask import Blueprint, send_from_directory
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Blueprint, Response, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+from database import get_pdf_file_or_404
+from utils.audio import get_audio_filename
+
+# Podcast URLs carry the audio version, so a matching URL never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 def create_static_bp(app):
     bp = Blueprint("static", __name__)
 
-    @bp.route("/uploads/<filename>")
+    def send_stored_file(folder, location, filename, max_age=None):
+        """
+        Serve a file from folder, letting nginx send it when configured.
+
+        With X_ACCEL_REDIRECT_PREFIX set, nginx serves
+        <prefix>/<location>/<filename> from an internal location and can
+        use sendfile(2); otherwise send_from_directory handles ranges and
+        conditional requests (and X-Sendfile if app.use_x_sendfile is on).
+        max_age lets browsers reuse the file for that many seconds.
+
+        Only requests whose TCP peer is in X_ACCEL_TRUSTED_PROXIES are handed
+        back to nginx; one made straight to the app, e.g. in development,
+        would otherwise get an empty body. Forwarding headers are set by the
+        client, so they are not trusted for this.
+        """
+        accel_prefix = app.config.get("X_ACCEL_REDIRECT_PREFIX")
+        trusted = app.config.get("X_ACCEL_TRUSTED_PROXIES") or ()
+        if not accel_prefix or request.remote_addr not in trusted:
+            return send_from_directory(folder, filename, max_age=max_age)
+
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = (
+            f"{accel_prefix.rstrip('/')}/{location}/{quote(filename)}"
+        )
+        # nginx keeps Cache-Control from this response when it sends the file
+        if max_age:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response
+
+    @bp.route("/uploads/<path:filename>")
     def uploaded_file(filename):
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+        return send_stored_file(
+            app.config["UPLOAD_FOLDER"],
+            "uploads",
+            filename,
+            max_age=app.config["STORED_FILE_MAX_AGE"],
+        )
 
-    @bp.route("/generated_audio/<filename>")
+    @bp.route("/generated_audio/<path:filename>")
     def generated_audio(filename):
-        return send_from_directory(app.config["GENERATED_AUDIO_FOLDER"], filename)
+        return send_stored_file(
+            app.config["GENERATED_AUDIO_FOLDER"],
+            "generated_audio",
+            filename,
+            max_age=app.config["STORED_FILE_MAX_AGE"],
+        )
+
+    @bp.route("/generated_audio/stream/<int:file_id>")
+    def stream_audio(file_id):
+        """
+        Serve a podcast's MP3 with Range and conditional request support.
+
+        Requests for the current ?v= version may be cached by the browser
+        (and the service worker) for good; regenerating changes the version.
+        The URL always names the same MP3 bytes, so a player resuming with
+        Range gets the rest of the file it started on.
+        """
+        pdf_file = get_pdf_file_or_404(file_id)
+        # Unversioned requests revalidate, since regenerating keeps the name
+        response = send_from_directory(
+            app.config["GENERATED_AUDIO_FOLDER"],
+            get_audio_filename(pdf_file),
+            conditional=True,
+        )
+        version = request.args.get("v")
+        if version and version == pdf_file.audio_version:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
 
     return bp
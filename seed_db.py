@@ -1,4 +1,5 @@
-from app import app, db, PDFFile, Folder
+from app import app
+from database import db, PDFFile, Folder
 import os
 
 with app.app_context():
@@ -1,24 +1,54 @@
 import os
-import json
+import bisect
 import fitz
-import io
 import re
+import math
 import pathlib
+import queue
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Optional, Generator, List, Tuple, Any
-from pydub import AudioSegment
+from utils.audio import PCMAudio, convert_pcm, read_wav, silence
 from database import get_settings
 from config import config
 
-STATIC_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 
 # Try to import OpenAI for DeepInfra Kokoro TTS
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
 
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
+# HTTP/2 lets concurrent TTS and completion requests share one TLS connection
+try:
+    import h2  # noqa: F401 - only needed by httpx
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Summary, transcript and podcast calls are often minutes apart; keep idle
+# connections long enough to skip a new TCP/TLS handshake for the next one
+HTTP_KEEPALIVE_SECONDS = 120
+
+
+def _http_client():
+    """Keep-alive (and, with h2 installed, HTTP/2) client for an API."""
+    return DefaultHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+    )
+
 # --- Default settings from environment ---
 SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "openai/gpt-5.2")
 TRANSCRIPT_MODEL = os.environ.get("TRANSCRIPT_MODEL", "openai/gpt-5.2")
@@ -28,10 +58,6 @@ TTS_HOST_VOICE = os.environ.get("TTS_HOST_VOICE", "af_bella")
 TTS_EXPERT_VOICE = os.environ.get("TTS_EXPERT_VOICE", "am_onyx")
 TTS_LENGTH = os.environ.get("TTS_LENGTH", "")
 
-# --- Global lists for models and voices ---
-available_text_models = []
-available_tts_models = []
-
 # Kokoro voices from DeepInfra - see https://huggingface.co/hexgrad/Kokoro-82M/blob/main/VOICES.md
 # Format: (voice_id, description)
 available_voices = [
@@ -102,28 +128,55 @@ available_voices = [
 ]
 
 
+def model_catalog(app_instance):
+    """
+    Models and voices offered on the settings page.
+
+    Filled in when the clients are initialized (at startup and when an API
+    key changes), so rendering settings never lists models over the network.
+    """
+    return app_instance.extensions.setdefault(
+        "model_catalog",
+        {
+            "text": [SUMMARY_MODEL, TRANSCRIPT_MODEL, CHAT_MODEL],
+            "tts": [TTS_MODEL],
+            "voices": available_voices,
+        },
+    )
+
+
 def init_tts_client(app_instance):
     """
     Initialize the TTS client for DeepInfra Kokoro.
     Uses OpenAI-compatible API.
     """
-    global available_tts_models
     with app_instance.app_context():
         settings = get_settings()
         api_key = settings.deepinfra_api_key or os.environ.get("DEEPINFRA_API_KEY")
 
+        # Saving settings calls this again; keep the client if the key is unchanged
+        if (
+            api_key
+            and getattr(app_instance, "tts_client", None)
+            and getattr(app_instance, "_tts_client_key", None) == api_key
+        ):
+            return
+
         if api_key and OPENAI_AVAILABLE:
             try:
                 client = OpenAI(
-                    base_url="https://api.deepinfra.com/v1/openai", api_key=api_key
+                    base_url="https://api.deepinfra.com/v1/openai",
+                    api_key=api_key,
+                    http_client=_http_client(),
                 )
                 app_instance.tts_client = client
+                app_instance._tts_client_key = api_key
                 app_instance.logger.info(
                     "DeepInfra Kokoro TTS Client initialized successfully."
                 )
 
                 # Kokoro is the only model for now
-                available_tts_models = ["hexgrad/Kokoro-82M"]
+                model_catalog(app_instance)["tts"] = ["hexgrad/Kokoro-82M"]
             except Exception as e:
                 app_instance.tts_client = None
                 app_instance.logger.error(
@@ -146,15 +199,27 @@ def init_text_client(app_instance):
     Initialize the text generation client for NanoGPT.
     Uses OpenAI-compatible API.
     """
-    global available_text_models
     with app_instance.app_context():
         settings = get_settings()
         api_key = settings.nanogpt_api_key or os.environ.get("NANOGPT_API_KEY")
 
+        # Saving settings calls this again; keep the client if the key is unchanged
+        if (
+            api_key
+            and getattr(app_instance, "text_client", None)
+            and getattr(app_instance, "_text_client_key", None) == api_key
+        ):
+            return
+
         if api_key and OPENAI_AVAILABLE:
             try:
-                client = OpenAI(base_url="https://nano-gpt.com/api/v1", api_key=api_key)
+                client = OpenAI(
+                    base_url="https://nano-gpt.com/api/v1",
+                    api_key=api_key,
+                    http_client=_http_client(),
+                )
                 app_instance.text_client = client
+                app_instance._text_client_key = api_key
                 app_instance.logger.info(
                     "NanoGPT text client initialized successfully."
                 )
@@ -162,18 +227,17 @@ def init_text_client(app_instance):
                 # List available models - try to get them from the API
                 try:
                     models = client.models.list()
-                    available_text_models = [m.id for m in models.data]
-                    app_instance.logger.info(
-                        f"Found {len(available_text_models)} text models."
-                    )
+                    text_models = [m.id for m in models.data]
+                    app_instance.logger.info(f"Found {len(text_models)} text models.")
                 except Exception as e:
                     app_instance.logger.warning(f"Could not fetch models list: {e}")
                     # Default models if we can't fetch the list
-                    available_text_models = [
+                    text_models = [
                         SUMMARY_MODEL,
                         TRANSCRIPT_MODEL,
                         CHAT_MODEL,
                     ]
+                model_catalog(app_instance)["text"] = text_models
             except Exception as e:
                 app_instance.text_client = None
                 app_instance.logger.error(
@@ -191,6 +255,14 @@ def init_text_client(app_instance):
                 )
 
 
+# Summary, transcript and chat threads start independently (batch imports start
+# one per document), so cap how many completions are in flight at once
+_completion_slots = threading.BoundedSemaphore(config.LLM_CONCURRENCY)
+
+# Marks the end of a streamed completion in generate_text_stream's buffer
+_STREAM_END = object()
+
+
 def generate_text_completion(text_client, model, prompt, system_prompt=None):
     """
     Generate text completion using NanoGPT.
@@ -204,7 +276,22 @@ def generate_text_completion(text_client, model, prompt, system_prompt=None):
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": prompt})
 
-    response = text_client.chat.completions.create(model=model, messages=messages)
+    with _completion_slots:
+        response = text_client.chat.completions.create(model=model, messages=messages)
+
+    return response.choices[0].message.content
+
+
+def generate_chat_completion(text_client, model, messages):
+    """
+    Run a chat completion over a prepared message list via NanoGPT.
+    Returns the generated text.
+    """
+    if not text_client:
+        raise Exception("Text client not initialized")
+
+    with _completion_slots:
+        response = text_client.chat.completions.create(model=model, messages=messages)
 
     return response.choices[0].message.content
 
@@ -227,7 +314,8 @@ def generate_text_with_file(
     context = f"Document content:\n{file_content}\n\n---\n\nUser question: {prompt}"
     messages.append({"role": "user", "content": context})
 
-    response = text_client.chat.completions.create(model=model, messages=messages)
+    with _completion_slots:
+        response = text_client.chat.completions.create(model=model, messages=messages)
 
     return response.choices[0].message.content
 
@@ -236,6 +324,10 @@ def generate_text_stream(text_client, model, file_content, prompt, system_prompt
     """
     Generate text using streaming via NanoGPT.
     Yields tokens as they are generated.
+
+    The stream is read on its own thread into a buffer, so the completion
+    slot is released as soon as the model finishes, however slowly the
+    caller consumes the tokens (e.g. voicing each turn as it arrives).
     """
     if not text_client:
         raise Exception("Text client not initialized")
@@ -248,16 +340,39 @@ def generate_text_stream(text_client, model, file_content, prompt, system_prompt
     context = f"Document content:\n{file_content}\n\n---\n\nUser question: {prompt}"
     messages.append({"role": "user", "content": context})
 
-    response = text_client.chat.completions.create(
-        model=model, messages=messages, stream=True
-    )
-
-    for chunk in response:
-        if chunk.choices and chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+    tokens = queue.SimpleQueue()
+    abandoned = threading.Event()
 
-
-def generate_voice_sample(tts_client, voice_id, text, speed=1.0):
+    def read_stream():
+        try:
+            with _completion_slots:
+                response = text_client.chat.completions.create(
+                    model=model, messages=messages, stream=True
+                )
+                for chunk in response:
+                    if abandoned.is_set():
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        tokens.put(chunk.choices[0].delta.content)
+        except Exception as e:
+            tokens.put(e)
+        finally:
+            tokens.put(_STREAM_END)
+
+    threading.Thread(target=read_stream, daemon=True).start()
+    try:
+        for token in iter(tokens.get, _STREAM_END):
+            if isinstance(token, Exception):
+                raise token
+            yield token
+    finally:
+        # A caller that stops early lets the reader drop the rest
+        abandoned.set()
+
+
+def generate_voice_sample(
+    tts_client, voice_id, text, speed=1.0, response_format="mp3"
+):
     """
     Generates a voice sample using DeepInfra Kokoro.
     Returns a tuple of (audio_data, format).
@@ -269,184 +384,469 @@ def generate_voice_sample(tts_client, voice_id, text, speed=1.0):
         model="hexgrad/Kokoro-82M",
         voice=voice_id,
         input=text,
-        response_format="mp3",
+        response_format=response_format,
         speed=speed,
     )
 
     # Read the audio content
     audio_data = response.content
-    return audio_data, "mp3"
+    return audio_data, response_format
 
 
-def generate_podcast_audio(tts_client, transcript, host_voice, expert_voice, speed=1.0):
-    """
-    Generates podcast audio from a transcript with two speakers.
+# "Host:" or "Expert:" at the start of a line, after markdown bold is removed
+DIALOGUE_SPEAKER_RE = re.compile(r"(Host|Expert):\s*")
 
-    The transcript should contain markers like:
-    "Host: Hello and welcome..."
-    "Expert: Thank you for having me..."
 
-    Returns the combined audio data as MP3.
+def parse_dialogue(transcript):
     """
-    if not tts_client:
-        raise Exception("TTS client not initialized")
+    Split a Host/Expert transcript into (speaker, text) segments.
+
+    Lines without a speaker marker continue the previous speaker's turn, and
+    turns with no text are dropped. Returns an empty list when the transcript
+    has no speaker markers at all.
+    """
+    return list(iter_dialogue(transcript.split("\n")))
 
-    # Parse the transcript for speaker segments
-    # Pattern: "Host:" or "Expert:" at the beginning of lines
-    segments = []
+
+def iter_dialogue(lines):
+    """
+    Yield parse_dialogue's segments from an iterable of lines, each one as
+    soon as the next speaker marker (or the end of the lines) closes it.
+    """
     current_speaker = None
     current_text = []
 
-    for line in transcript.split("\n"):
+    for line in lines:
         line = line.strip()
         # Handle markdown bold like **Host:** or **Expert:**
-        line_clean = line.replace("**", "").strip()
-        if line_clean.startswith("Host:"):
-            if current_speaker and current_text:
-                segments.append((current_speaker, " ".join(current_text)))
-            current_speaker = "host"
-            current_text = [line_clean[5:].strip()]
-        elif line_clean.startswith("Expert:"):
-            if current_speaker and current_text:
-                segments.append((current_speaker, " ".join(current_text)))
-            current_speaker = "expert"
-            current_text = [line_clean[7:].strip()]
+        match = DIALOGUE_SPEAKER_RE.match(line.replace("**", "").strip())
+        if match:
+            if current_speaker and any(current_text):
+                yield (current_speaker, " ".join(current_text))
+            current_speaker = match.group(1).lower()
+            current_text = [match.string[match.end() :]]
         elif current_speaker and line:
             current_text.append(line)
 
-    # Add the last segment
-    if current_speaker and current_text:
-        segments.append((current_speaker, " ".join(current_text)))
+    if current_speaker and any(current_text):
+        yield (current_speaker, " ".join(current_text))
+
+
+def generate_podcast_audio(
+    tts_client, transcript, host_voice, expert_voice, speed=1.0, pause_ms=500
+):
+    """
+    Generates podcast audio from a transcript with two speakers.
+
+    The transcript should contain markers like:
+    "Host: Hello and welcome..."
+    "Expert: Thank you for having me..."
+
+    Returns synthesize_dialogue's PCMAudio chunks for the transcript.
+    """
+    segments = parse_dialogue(transcript)
 
     # If no segments found, try as single speaker
     if not segments:
         segments = [("host", transcript)]
 
-    # Generate audio for each segment
-    combined_audio = AudioSegment.empty()
+    return synthesize_dialogue(
+        tts_client, segments, host_voice, expert_voice, speed, pause_ms
+    )
+
+
+def synthesize_dialogue(
+    tts_client, segments, host_voice, expert_voice, speed=1.0, pause_ms=500
+):
+    """
+    Voice (speaker, text) segments, which may still be arriving from a
+    generator, e.g. a transcript being streamed.
 
-    # Small pause between segments (in milliseconds)
-    pause = AudioSegment.silent(duration=500)
+    Yields PCMAudio chunks in segment order as soon as each segment is
+    ready, so callers can encode while later segments are still being
+    synthesized. Each segment is followed by a pause_ms chunk of silence;
+    all chunks are in the format of the first segment.
+    """
+    if not tts_client:
+        raise Exception("TTS client not initialized")
 
-    for speaker, text in segments:
+    def synthesize(segment):
+        speaker, text = segment
         voice_id = host_voice if speaker == "host" else expert_voice
 
         try:
-            audio_data, _ = generate_voice_sample(tts_client, voice_id, text, speed)
-            segment_audio = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
-            combined_audio += segment_audio + pause
+            # WAV unpacks to PCM without an MP3 decode per segment
+            audio_data, _ = generate_voice_sample(
+                tts_client, voice_id, text, speed, response_format="wav"
+            )
+            return read_wav(audio_data)
         except Exception as e:
             print(f"Error generating audio for {speaker}: {e}")
+            return None
+
+    workers = config.TTS_CONCURRENCY
+    if isinstance(segments, list):
+        workers = max(1, min(workers, len(segments)))
+
+    def synthesized():
+        # Segments are independent, so overlap their TTS round trips. Unlike
+        # executor.map this pulls segments lazily and keeps at most `workers`
+        # in flight, returning results in segment order
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for segment in segments:
+                in_flight.append(executor.submit(synthesize, segment))
+                if len(in_flight) >= workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    audio_format = None
+    for audio in synthesized():
+        if audio is None:
             continue
+        if audio_format is None:
+            audio_format = (audio.frame_rate, audio.channels, audio.sample_width)
+            pause = PCMAudio(silence(pause_ms, *audio_format), *audio_format)
+        # Separate chunks, so segment PCM isn't copied to append the pause
+        yield convert_pcm(audio, *audio_format)
+        yield pause
 
-    return combined_audio
+    if audio_format is None:
+        raise Exception("No audio was generated for any transcript segment")
 
 
-def process_pdf(filepath):
+# Captions must sit within this many points of the figure/table they describe
+CAPTION_MAX_GAP = 50
+
+# Leading "Figure"/"Fig." (group 1) or "Table"/"Tbl." (group 2) of a text block
+CAPTION_PREFIX_RE = re.compile(r"\s*(?:(figure|fig\.)|(table|tbl\.))", re.IGNORECASE)
+
+
+def _page_text(text_blocks):
+    """
+    A page's text, joined from its get_text("blocks") in reading order and
+    skipping image blocks (type 1).
+    """
+    return "".join(tb[4] for tb in text_blocks if tb[6] == 0)
+
+
+def _index_caption_blocks(text_blocks):
+    """
+    Pre-extract caption candidates from a page's text blocks.
+
+    Runs once per page so the per-image/per-table searches only look at the
+    few blocks that look like captions, using plain floats instead of
+    fitz.Rect. Figure candidates are (y0, order, x_center, text) sorted by the
+    top edge; table candidates are (y1, order, x_center, text) sorted by the
+    bottom edge, so both searches can bisect to the caption gap.
+    """
+    figure_captions = []
+    table_captions = []
+    match_prefix = CAPTION_PREFIX_RE.match
+    for order, tb in enumerate(text_blocks):
+        # Only blocks that look like captions get their text normalised
+        match = match_prefix(tb[4])
+        if not match:
+            continue
+        block_text = tb[4].strip().replace("\n", " ")
+        x_center = (tb[0] + tb[2]) / 2
+        if match.group(1):
+            figure_captions.append((tb[1], order, x_center, block_text))
+        else:
+            table_captions.append((tb[3], order, x_center, block_text))
+    figure_captions.sort()
+    table_captions.sort()
+    return figure_captions, table_captions
+
+
+def _first_in_block_order(hits):
+    # Several captions can fall in the gap; keep the one the page lists first
+    return min(hits)[1] if hits else ""
+
+
+def _find_caption_below(bbox, candidates):
+    """Return the first caption just below and horizontally inside bbox."""
+    x0, _, x1, bottom = bbox  # fitz.Rect or a plain (x0, y0, x1, y1) tuple
+    hits = []
+    i = bisect.bisect_right(candidates, (bottom, math.inf))
+    while i < len(candidates) and (candidates[i][0] - bottom) < CAPTION_MAX_GAP:
+        _, order, x_center, block_text = candidates[i]
+        if x0 < x_center < x1:
+            hits.append((order, block_text))
+        i += 1
+    return _first_in_block_order(hits)
+
+
+def _find_caption_above(bbox, candidates):
+    """Return the first caption just above and horizontally inside bbox."""
+    x0, top, x1, _ = bbox  # fitz.Rect or a plain (x0, y0, x1, y1) tuple
+    hits = []
+    i = bisect.bisect_left(candidates, (top, -math.inf)) - 1
+    while i >= 0 and (top - candidates[i][0]) < CAPTION_MAX_GAP:
+        _, order, x_center, block_text = candidates[i]
+        if x0 < x_center < x1:
+            hits.append((order, block_text))
+        i -= 1
+    return _first_in_block_order(hits)
+
+
+# Embedded JPEGs in these colorspaces are usable files exactly as stored
+PASSTHROUGH_COLORSPACES = ("DeviceRGB", "DeviceGray", "ICCBased")
+
+
+def _extract_image_bytes(doc, img):
+    """
+    Return (bytes, ext) for an entry of page.get_images(full=True).
+
+    Plain DCT-encoded images without a soft mask are written straight from
+    the raw stream; everything else goes through doc.extract_image().
+    """
+    xref, smask, _, _, _, colorspace, _, _, image_filter = img[:9]
+    if (
+        image_filter == "DCTDecode"
+        and not smask
+        and colorspace in PASSTHROUGH_COLORSPACES
+    ):
+        return doc.xref_stream_raw(xref), "jpeg"
+
+    base_image = doc.extract_image(xref)
+    return base_image["image"], base_image["ext"]
+
+
+def _open_figure_dir(figure_dir):
+    """Open figure_dir once so image files can be created relative to it."""
+    if os.open not in os.supports_dir_fd:
+        return None
+    return os.open(figure_dir, os.O_RDONLY | os.O_DIRECTORY)
+
+
+def _flush_figure_writes(figure_dir, dir_fd, pending_writes):
+    """
+    Write a batch of (filename, bytes) figure images into figure_dir.
+
+    Files are created relative to an already-open directory descriptor, so
+    each write skips resolving the full figure path again.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    for image_filename, image_bytes in pending_writes:
+        if dir_fd is None:
+            with open(os.path.join(figure_dir, image_filename), "wb") as f:
+                f.write(image_bytes)
+            continue
+
+        fd = os.open(image_filename, flags, 0o644, dir_fd=dir_fd)
+        try:
+            view = memoryview(image_bytes)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+
+
+def _process_page_range(filepath, page_start, page_end, figure_dir):
+    """
+    Extract text, captioned figures and captioned tables from a page range.
+
+    Runs inside a worker process, so it opens its own document handle
+    (fitz.Document objects cannot be pickled across processes).
+    Returns (text, elements) for pages [page_start, page_end).
+    """
     doc = fitz.open(filepath)
-    text = ""
+    text_parts = []
     elements = []
-    figure_dir = os.path.join(
-        STATIC_PATH, "figures", os.path.basename(filepath).replace(".pdf", "")
-    )
-    os.makedirs(figure_dir, exist_ok=True)
+    pending_writes = []
+    written_xrefs = {}
+    dir_fd = None
+    # Each page's images are written on a background thread while the next
+    # page is being parsed
+    writer = ThreadPoolExecutor(max_workers=1)
+    write_futures = []
+    # Small PDFs run this in the server process itself, so a failed page must
+    # not leave the writer thread, directory fd or document open
+    try:
+        dir_fd = _open_figure_dir(figure_dir)
+        for page_num in range(page_start, page_end):
+            if pending_writes:
+                write_futures.append(
+                    writer.submit(
+                        _flush_figure_writes, figure_dir, dir_fd, pending_writes
+                    )
+                )
+                pending_writes = []
+
+            page = doc.load_page(page_num)
+            # The text blocks hold the page text in reading order, so the flat
+            # text is assembled from them rather than extracted a second time
+            text_blocks = page.get_text("blocks")
+            text_parts.append(_page_text(text_blocks))
+            figure_captions, table_captions = _index_caption_blocks(text_blocks)
+
+            # --- Process Images ---
+            # Without a figure caption on the page no image can be kept
+            image_list = page.get_images(full=True) if figure_captions else []
+            for img_index, img in enumerate(image_list):
+                xref = img[0]
+                try:
+                    img_bbox = page.get_image_bbox(img)
+                except ValueError:
+                    continue  # Skip if bbox cannot be found
 
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        text += page.get_text()
-        text_blocks = page.get_text("blocks")
+                # Filter out small decorative images based on size
+                if img[2] < 100 and img[3] < 100:
+                    continue
+
+                # Search for a caption below the image
+                found_caption = _find_caption_below(img_bbox, figure_captions)
+
+                if found_caption:
+                    # Images reused across pages share one xref; write them once
+                    image_path = written_xrefs.get(xref)
+                    if image_path is None:
+                        image_bytes, image_ext = _extract_image_bytes(doc, img)
+                        image_filename = f"image_{page_num + 1}_{img_index}.{image_ext}"
+                        image_path = os.path.join(figure_dir, image_filename)
+                        pending_writes.append((image_filename, image_bytes))
+                        written_xrefs[xref] = image_path
+
+                    elements.append(
+                        {
+                            "type": "figure",
+                            "path": image_path,
+                            "caption": found_caption,
+                            "page": page_num + 1,
+                        }
+                    )
 
-        # --- Process Images ---
-        image_list = page.get_images(full=True)
-        for img_index, img in enumerate(image_list):
-            xref = img[0]
+            # --- Process Tables ---
             try:
-                img_bbox = page.get_image_bbox(img)
-            except ValueError:
-                continue  # Skip if bbox cannot be found
-
-            base_image = doc.extract_image(xref)
-            # Filter out small decorative images based on size
-            if base_image["width"] < 100 and base_image["height"] < 100:
-                continue
-
-            # Search for a caption below the image
-            found_caption = ""
-            for tb in text_blocks:
-                text_bbox = fitz.Rect(tb[:4])
-                # Check if text block is below the image and reasonably close
-                if text_bbox.y0 > img_bbox.y1 and (text_bbox.y0 - img_bbox.y1) < 50:
-                    # Check if text is horizontally aligned with the image
-                    text_center_x = (text_bbox.x0 + text_bbox.x1) / 2
-                    if img_bbox.x0 < text_center_x < img_bbox.x1:
-                        block_text = tb[4].strip().replace("\n", " ")
-                        if block_text.lower().startswith(("figure", "fig.")):
-                            found_caption = block_text
-                            break
-
-            if found_caption:
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
-                image_filename = f"image_{page_num + 1}_{img_index}.{image_ext}"
-                image_path = os.path.join(figure_dir, image_filename)
-                with open(image_path, "wb") as f:
-                    f.write(image_bytes)
-
-                elements.append(
-                    {"type": "figure", "path": image_path, "caption": found_caption}
-                )
+                # Table detection is the slowest step; skip pages with no caption
+                tables = page.find_tables() if table_captions else []
+                for table_index, table in enumerate(tables):
+                    # Search for a caption (typically above the table)
+                    found_caption = _find_caption_above(table.bbox, table_captions)
+
+                    if found_caption:
+                        table_data = table.extract()
+                        # Filter out empty or very small tables
+                        if table_data and len(table_data) > 1:
+                            elements.append(
+                                {
+                                    "type": "table",
+                                    "data": table_data,
+                                    "caption": found_caption,
+                                    "page": page_num + 1,
+                                }
+                            )
+            except Exception as e:
+                # Log error if table processing fails for a page
+                import logging
 
-        # --- Process Tables ---
-        try:
-            tables = page.find_tables()
-            for table_index, table in enumerate(tables):
-                table_bbox = fitz.Rect(table.bbox)
-
-                # Search for a caption (typically above the table)
-                found_caption = ""
-                for tb in text_blocks:
-                    text_bbox = fitz.Rect(tb[:4])
-                    # Check if text block is above the table and reasonably close
-                    if (
-                        table_bbox.y0 > text_bbox.y1
-                        and (table_bbox.y0 - text_bbox.y1) < 50
-                    ):
-                        # Check if text is horizontally aligned
-                        text_center_x = (text_bbox.x0 + text_bbox.x1) / 2
-                        if table_bbox.x0 < text_center_x < table_bbox.x1:
-                            block_text = tb[4].strip().replace("\n", " ")
-                            if block_text.lower().startswith(("table", "tbl.")):
-                                found_caption = block_text
-                                break
+                logging.warning(f"Could not process tables on page {page_num + 1}: {e}")
 
-                if found_caption:
-                    table_data = table.extract()
-                    # Filter out empty or very small tables
-                    if table_data and len(table_data) > 1:
-                        elements.append(
-                            {
-                                "type": "table",
-                                "data": table_data,
-                                "caption": found_caption,
-                                "page": page_num + 1,
-                            }
-                        )
-        except Exception as e:
-            # Log error if table processing fails for a page
-            import logging
+        write_futures.append(
+            writer.submit(_flush_figure_writes, figure_dir, dir_fd, pending_writes)
+        )
+    finally:
+        writer.shutdown(wait=True)
+        if dir_fd is not None:
+            os.close(dir_fd)
+        doc.close()
+    for future in write_futures:
+        future.result()  # Re-raise any write error
+    return "".join(text_parts), elements
+
+
+# Page ranges handed to each extraction worker over one process_pdf call
+PDF_TASKS_PER_WORKER = 4
+
+
+def figure_dir_path(storage_stem):
+    """Directory under static/figures holding a PDF's extracted images."""
+    return os.path.join(STATIC_PATH, "figures", storage_stem)
 
-            logging.warning(f"Could not process tables on page {page_num + 1}: {e}")
+
+def _upload_figure_dir(filepath):
+    # Uploads are saved under their storage name
+    return figure_dir_path(os.path.splitext(os.path.basename(filepath))[0])
+
+
+def extract_pdf_text(filepath):
+    """Text-only pass over a PDF, giving the same text process_pdf returns."""
+    with fitz.open(filepath) as doc:
+        return "".join(_page_text(page.get_text("blocks")) for page in doc)
+
+
+def reuse_pdf_elements(elements, filepath):
+    """
+    Re-home elements extracted from an identical PDF onto this upload.
+
+    Figure images are hard-linked (or copied across filesystems) into this
+    upload's figure directory so deleting or renaming either file leaves the
+    other intact. Raises FileNotFoundError if a source image is missing.
+    """
+    figure_dir = _upload_figure_dir(filepath)
+    os.makedirs(figure_dir, exist_ok=True)
+
+    reused = []
+    for element in elements:
+        element = dict(element)
+        source = element.get("path")
+        if element.get("type") == "figure" and source:
+            target = os.path.join(figure_dir, os.path.basename(source))
+            if os.path.abspath(source) != os.path.abspath(target):
+                if os.path.exists(target):
+                    os.remove(target)
+                try:
+                    os.link(source, target)
+                except OSError as e:
+                    if not os.path.exists(source):
+                        raise FileNotFoundError(source) from e
+                    shutil.copy2(source, target)
+            element["path"] = target
+        reused.append(element)
+    return reused
+
+
+def process_pdf(filepath):
+    with fitz.open(filepath) as doc:
+        page_count = len(doc)
+
+    figure_dir = _upload_figure_dir(filepath)
+    os.makedirs(figure_dir, exist_ok=True)
+
+    workers = min(config.PDF_PROCESS_WORKERS, page_count)
+    if workers <= 1 or page_count < config.PDF_PARALLEL_MIN_PAGES:
+        text, elements = _process_page_range(filepath, 0, page_count, figure_dir)
+    else:
+        # A few contiguous page ranges per worker, so one worker that drew the
+        # figure-heavy pages doesn't hold up the rest; merged in page order
+        chunk_size = max(
+            config.PDF_MIN_PAGES_PER_TASK,
+            math.ceil(page_count / (workers * PDF_TASKS_PER_WORKER)),
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _process_page_range,
+                    filepath,
+                    page_start,
+                    min(page_start + chunk_size, page_count),
+                    figure_dir,
+                )
+                for page_start in range(0, page_count, chunk_size)
+            ]
+            results = [future.result() for future in futures]
+        text = "".join(chunk_text for chunk_text, _ in results)
+        elements = [element for _, chunk in results for element in chunk]
 
     # Sort elements by page and then by vertical position
     # This is a bit tricky since we don't store y-pos, but page order is a good start.
     # A more robust solution would store the y-coordinate of each element.
     # For now, we assume the order of discovery is sufficient.
 
-    return (
-        text,
-        json.dumps(elements),
-        json.dumps([]),
-    )  # Return empty list for old captions
+    return text, elements
 
 
 def allowed_file(filename):
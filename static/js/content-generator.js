@@ -23,37 +23,51 @@ function removePendingTask(fileId) {
 
 function pollTaskStatus(taskUrl, fileId, type) {
     if (activePollers[fileId]) {
-        clearInterval(activePollers[fileId]);
-    }
-
-    const interval = setInterval(() => {
-        fetch(taskUrl)
-            .then(response => response.json())
-            .then(data => {
-                if (data.status === 'complete') {
-                    clearInterval(interval);
-                    delete activePollers[fileId];
-                    removePendingTask(fileId);
-                    updateFileContent(fileId);
-                    showNotification(`${type} Generation Complete`, `The ${type.toLowerCase()} for your file is ready.`);
-                    updateButtonState(fileId, type, 'complete');
-                    // Reload page to show server-rendered content
-                    setTimeout(() => window.location.reload(), 1000);
-                } else if (data.status === 'error') {
-                    clearInterval(interval);
-                    delete activePollers[fileId];
-                    removePendingTask(fileId);
-                    showGenerationError(fileId, type, data.result?.error);
-                }
-            })
-            .catch(err => {
-                clearInterval(interval);
-                delete activePollers[fileId];
-                handlePollingError(fileId, type, err);
-            });
-    }, 2000);
-
-    activePollers[fileId] = interval;
+        activePollers[fileId].stop();
+    }
+
+    const taskId = taskUrl.split('/').pop();
+    activePollers[fileId] = watchTask(taskId, taskUrl, data => {
+        delete activePollers[fileId];
+        removePendingTask(fileId);
+        finishGeneration(fileId, type, data);
+    }, err => {
+        delete activePollers[fileId];
+        handlePollingError(fileId, type, err);
+    });
+}
+
+function finishGeneration(fileId, type, data) {
+    if (data.status === 'complete') {
+        updateFileContent(fileId);
+        showNotification(`${type} Generation Complete`, `The ${type.toLowerCase()} for your file is ready.`);
+        updateButtonState(fileId, type, 'complete');
+        // Reload page to show server-rendered content
+        setTimeout(() => window.location.reload(), 1000);
+    } else {
+        showGenerationError(fileId, type, data.result?.error);
+    }
+}
+
+// Start a generation job. The server answers 200 with the finished status
+// when the result already exists, or 202 with a task to follow.
+function startGeneration(url, statusPath, fileId, type) {
+    return fetch(url, { method: 'POST' })
+        .then(response => {
+            if (response.status === 200 || response.status === 202) {
+                return response.json().then(data => ({ finished: response.status === 200, data }));
+            }
+            throw new Error(`Failed to start ${type.toLowerCase()} generation.`);
+        })
+        .then(({ finished, data }) => {
+            if (finished) {
+                finishGeneration(fileId, type, data);
+                return;
+            }
+            const taskUrl = `${statusPath}/${data.task_id}`;
+            savePendingTask(fileId, { taskUrl: taskUrl, type: type });
+            pollTaskStatus(taskUrl, fileId, type);
+        });
 }
 
 function updateButtonState(fileId, type, status) {
@@ -83,6 +97,8 @@ function updateButtonState(fileId, type, status) {
         button.textContent = text;
         button.classList.remove(removeClass);
         button.classList.add(addClass);
+        // From now on the button regenerates rather than reusing a cached result
+        button.dataset.force = '1';
     }
 
     if (type === 'Transcript') {
@@ -133,7 +149,12 @@ function handlePollingError(fileId, type, err) {
     }
 }
 
-function summarizeFile(fileId) {
+// ?force=1 skips any cached or up-to-date result and calls the model again
+function forceQuery(force) {
+    return force ? '?force=1' : '';
+}
+
+function summarizeFile(fileId, force) {
     fileId = fileId || window.CURRENT_FILE_ID;
     if (!fileId) {
         showToast('No file selected', 'warning');
@@ -146,19 +167,7 @@ function summarizeFile(fileId) {
     }
     requestNotificationPermission();
 
-    fetch(`/summarize_file/${fileId}`, { method: 'POST' })
-        .then(response => {
-            if (response.status === 202) {
-                return response.json();
-            } else {
-                throw new Error('Failed to start summary generation.');
-            }
-        })
-        .then(data => {
-            const taskUrl = `/summarize_status/${data.task_id}`;
-            savePendingTask(fileId, { taskUrl: taskUrl, type: 'Summary' });
-            pollTaskStatus(taskUrl, fileId, 'Summary');
-        })
+    startGeneration(`/summarize_file/${fileId}${forceQuery(force)}`, '/summarize_status', fileId, 'Summary')
         .catch(err => {
             const summaryContent = document.getElementById('summary-content');
             if (summaryContent) {
@@ -167,7 +176,7 @@ function summarizeFile(fileId) {
         });
 }
 
-function generateTranscript(fileId) {
+function generateTranscript(fileId, force) {
     fileId = fileId || window.CURRENT_FILE_ID;
     if (!fileId) {
         showToast('No file selected', 'warning');
@@ -180,19 +189,7 @@ function generateTranscript(fileId) {
     }
     requestNotificationPermission();
 
-    fetch(`/generate_transcript/${fileId}`, { method: 'POST' })
-        .then(response => {
-            if (response.status === 202) {
-                return response.json();
-            } else {
-                throw new Error('Failed to start transcript generation.');
-            }
-        })
-        .then(data => {
-            const taskUrl = `/transcript_status/${data.task_id}`;
-            savePendingTask(fileId, { taskUrl: taskUrl, type: 'Transcript' });
-            pollTaskStatus(taskUrl, fileId, 'Transcript');
-        })
+    startGeneration(`/generate_transcript/${fileId}${forceQuery(force)}`, '/transcript_status', fileId, 'Transcript')
         .catch(err => {
             const transcriptContent = document.getElementById('transcript-content');
             if (transcriptContent) {
@@ -201,7 +198,7 @@ function generateTranscript(fileId) {
         });
 }
 
-function generatePodcast(fileId) {
+function generatePodcast(fileId, force) {
     fileId = fileId || window.CURRENT_FILE_ID;
     if (!fileId) {
         showToast('No file selected', 'warning');
@@ -216,19 +213,7 @@ function generatePodcast(fileId) {
     button.disabled = true;
     requestNotificationPermission();
 
-    fetch(`/generate_podcast/${fileId}`, { method: 'POST' })
-        .then(response => {
-            if (response.status === 202) {
-                return response.json();
-            } else {
-                throw new Error('Failed to start podcast generation.');
-            }
-        })
-        .then(data => {
-            const taskUrl = `/podcast_status/${data.task_id}`;
-            savePendingTask(fileId, { taskUrl: taskUrl, type: 'Podcast' });
-            pollTaskStatus(taskUrl, fileId, 'Podcast');
-        })
+    startGeneration(`/generate_podcast/${fileId}${forceQuery(force)}`, '/podcast_status', fileId, 'Podcast')
         .catch(err => {
             showNotification('Podcast Error', 'Error starting podcast generation: ' + err.message);
             button.innerHTML = 'Podcast';
@@ -146,7 +146,7 @@ function initFileListHandlers() {
         }
         else if (actionButton) {
             event.preventDefault();
-            const { action, id, filename, name } = actionButton.dataset;
+            const { action, id, filename, name, force } = actionButton.dataset;
 
             switch (action) {
                 case 'renameFile':
@@ -159,13 +159,13 @@ function initFileListHandlers() {
                     deleteFile(id);
                     break;
                 case 'summarizeFile':
-                    window.summarizeFile(id);
+                    window.summarizeFile(id, force === '1');
                     break;
                 case 'generateTranscript':
-                    window.generateTranscript(id);
+                    window.generateTranscript(id, force === '1');
                     break;
                 case 'generatePodcast':
-                    window.generatePodcast(id);
+                    window.generatePodcast(id, force === '1');
                     break;
                 case 'renameFolder':
                     renameFolder(id, name);
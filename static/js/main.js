@@ -128,6 +128,9 @@ function initFileUpload() {
     const uploadProgress = document.getElementById('upload-progress');
     
     let xhr = null;
+    const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+    const UPLOAD_CHUNK_RETRIES = 3;
+    const UPLOAD_RETRY_DELAY_MS = 1000;
 
     // Drag and drop handlers
     if (dropzone) {
@@ -171,32 +174,62 @@ function initFileUpload() {
         document.getElementById('upload-filename').textContent = file.name;
         uploadProgress.style.display = 'block';
         
-        // Create FormData
-        const formData = new FormData();
-        formData.append('file', file);
+        if (!file.size) {
+            showToast('Upload failed. The file is empty.', 'error');
+            resetUpload();
+            return;
+        }
         
         const ragflowDataset = document.getElementById('ragflow-dataset-select')?.value;
+        // The server issues the id every chunk of this upload is sent to
+        fetch('/upload_chunk', { method: 'POST', headers: uploadHeaders(file, ragflowDataset) })
+            .then(response => response.json().then(data => {
+                if (!response.ok) throw new Error(data.error || 'Please try again.');
+                return data.upload_id;
+            }))
+            .then(uploadId => sendUploadChunk(
+                file, uploadId, ragflowDataset, 0, UPLOAD_CHUNK_RETRIES
+            ))
+            .catch(err => {
+                showToast('Upload failed. ' + err.message, 'error');
+                resetUpload();
+            });
+    }
+
+    function uploadHeaders(file, ragflowDataset) {
+        const headers = { 'X-Filename': encodeURIComponent(file.name) };
         if (ragflowDataset) {
-            formData.append('ragflow_dataset', ragflowDataset);
+            headers['X-Ragflow-Dataset'] = ragflowDataset;
         }
-        
-        // Create XHR for progress
+        return headers;
+    }
+    
+    // The PDF is sent as raw chunks with Content-Range, so the server skips
+    // multipart parsing and a dropped connection only costs the current chunk
+    function sendUploadChunk(file, uploadId, ragflowDataset, start, retriesLeft) {
+        const end = Math.min(start + UPLOAD_CHUNK_BYTES, file.size);
         xhr = new XMLHttpRequest();
         xhr.upload.addEventListener('progress', (e) => {
-            if (e.lengthComputable) {
-                const percent = Math.round((e.loaded / e.total) * 100);
+            if (e.lengthComputable && file.size) {
+                const percent = Math.round(((start + e.loaded) / file.size) * 100);
                 document.getElementById('upload-percentage').textContent = percent + '%';
                 document.getElementById('upload-progress-fill').style.width = percent + '%';
             }
         });
         
         xhr.addEventListener('load', () => {
-            if (xhr.status >= 200 && xhr.status < 300) {
+            if (xhr.status === 308) {
+                const received = JSON.parse(xhr.responseText).received;
+                sendUploadChunk(file, uploadId, ragflowDataset, received, UPLOAD_CHUNK_RETRIES);
+            } else if (xhr.status >= 200 && xhr.status < 300) {
                 try {
                     const data = JSON.parse(xhr.responseText);
                     if (data.error) {
                         showToast('Upload failed: ' + data.error, 'error');
                         resetUpload();
+                    } else if (data.task_id) {
+                        document.getElementById('upload-percentage').textContent = 'Processing...';
+                        pollUploadStatus(data.task_id);
                     } else {
                         window.location.href = data.redirect || '/?file=' + data.file_id;
                     }
@@ -204,20 +237,60 @@ function initFileUpload() {
                     window.location.href = '/';
                 }
             } else {
-                showToast('Upload failed. Please try again.', 'error');
+                let error = 'Please try again.';
+                try {
+                    error = JSON.parse(xhr.responseText).error || error;
+                } catch {}
+                showToast('Upload failed. ' + error, 'error');
                 resetUpload();
             }
         });
         
         xhr.addEventListener('error', () => {
-            showToast('Upload failed. Please check your connection.', 'error');
-            resetUpload();
+            if (retriesLeft <= 0) {
+                showToast('Upload failed. Please check your connection.', 'error');
+                resetUpload();
+                return;
+            }
+            // Ask the server how much arrived and carry on from there,
+            // unless the upload was cancelled in the meantime
+            const failed = xhr;
+            setTimeout(() => {
+                if (xhr !== failed) return;
+                // An expired upload answers 404; resending then reports it
+                fetch(`/upload_chunk/${uploadId}`)
+                    .then(response => response.ok ? response.json() : Promise.reject())
+                    .then(data => data.received)
+                    .catch(() => start)
+                    .then(received => sendUploadChunk(
+                        file, uploadId, ragflowDataset, received, retriesLeft - 1
+                    ));
+            }, UPLOAD_RETRY_DELAY_MS);
         });
         
-        xhr.open('POST', uploadForm.action);
-        xhr.send(formData);
+        xhr.open('POST', `/upload_chunk/${uploadId}`);
+        xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+        xhr.setRequestHeader('Content-Range', `bytes ${start}-${end - 1}/${file.size}`);
+        for (const [name, value] of Object.entries(uploadHeaders(file, ragflowDataset))) {
+            xhr.setRequestHeader(name, value);
+        }
+        xhr.send(file.slice(start, end));
     }
     
+    function pollUploadStatus(taskId) {
+        watchTask(taskId, `/upload_status/${taskId}`, data => {
+            if (data.status === 'complete') {
+                window.location.href = `/?file=${data.result.file_id}&generate=summary`;
+            } else {
+                showToast('Upload failed: ' + (data.result?.error || 'Unknown error'), 'error');
+                resetUpload();
+            }
+        }, () => {
+            showToast('Lost track of the upload. Please refresh the page.', 'error');
+            resetUpload();
+        });
+    }
+
     function resetUpload() {
         uploadProgress.style.display = 'none';
         document.getElementById('upload-percentage').textContent = '0%';
@@ -227,6 +300,7 @@ function initFileUpload() {
     window.cancelUpload = function() {
         if (xhr) {
             xhr.abort();
+            xhr = null;
             showToast('Upload cancelled', 'info');
             resetUpload();
         }
@@ -249,11 +323,11 @@ function initFileUpload() {
             return;
         }
         
-        const file = fileInput.files[0];
-        if (!file.name.toLowerCase().endsWith('.pdf')) {
-            e.preventDefault();
-            showToast('Only PDF files are supported.', 'error');
-            return;
+        // Uploads always go through the background task and its status
+        // stream, never a full-page POST that waits for processing
+        e.preventDefault();
+        if (uploadProgress.style.display !== 'block') {
+            handleFileSelect(fileInput.files[0]);
         }
     });
 }
@@ -270,7 +270,7 @@ function resetGenerateButton(type) {
     isGenerating = false;
 }
 
-function streamSummary() {
+function streamSummary(force) {
     if (isGenerating) return;
     isGenerating = true;
 
@@ -292,7 +292,7 @@ function streamSummary() {
     let fullText = '';
 
     const fileId = window.CURRENT_FILE_ID;
-    currentEventSource = new EventSource(`/summarize_stream/${fileId}`);
+    currentEventSource = new EventSource(`/summarize_stream/${fileId}${force ? '?force=1' : ''}`);
 
     currentEventSource.onmessage = function(event) {
         const data = JSON.parse(event.data);
@@ -424,7 +424,14 @@ function generatePodcast() {
         if (!r.ok) throw new Error('HTTP ' + r.status);
         return r.json();
     })
-    .then(data => pollTask(data.task_id, 'podcast', true))
+    .then(data => {
+        // 200 with a finished status when the audio is already up to date
+        if (data.status === 'complete') {
+            showInlineSuccess('podcast');
+        } else {
+            pollTask(data.task_id, 'podcast', true);
+        }
+    })
     .catch(err => {
         clearTimeout(timeoutId);
         console.error('Generate podcast error:', err);
@@ -436,7 +443,7 @@ function generatePodcast() {
 
 function regenerateSummary() {
     if (!confirm('Regenerate summary?')) return;
-    streamSummary();
+    streamSummary(true);
 }
 
 function regenerateTranscript() {
@@ -30,6 +30,64 @@ function showNotification(title, body) {
     }
 }
 
+// Each open /task_stream holds a server thread and one of the ~6 connections
+// a browser allows per host, so only this many tasks are streamed at once;
+// any further ones are polled.
+const MAX_TASK_STREAMS = 2;
+let openTaskStreams = 0;
+
+// Follow a background task until it finishes. The server pushes the final
+// status over /task_stream; if that connection fails, or MAX_TASK_STREAMS
+// are already open, poll statusUrl instead.
+function watchTask(taskId, statusUrl, onFinish, onError) {
+    const watcher = { source: null, interval: null, stopped: false };
+    const closeSource = () => {
+        if (!watcher.source) return;
+        watcher.source.close();
+        watcher.source = null;
+        openTaskStreams--;
+    };
+    watcher.stop = () => {
+        watcher.stopped = true;
+        closeSource();
+        if (watcher.interval) clearInterval(watcher.interval);
+    };
+    const finish = (data) => {
+        if (watcher.stopped) return;
+        watcher.stop();
+        onFinish(data);
+    };
+    const poll = () => {
+        watcher.interval = setInterval(() => {
+            fetch(statusUrl)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'complete' || data.status === 'error') {
+                        finish(data);
+                    }
+                })
+                .catch(err => {
+                    if (watcher.stopped) return;
+                    watcher.stop();
+                    onError(err);
+                });
+        }, 2000);
+    };
+
+    if (window.EventSource && openTaskStreams < MAX_TASK_STREAMS) {
+        openTaskStreams++;
+        watcher.source = new EventSource(`/task_stream/${taskId}`);
+        watcher.source.onmessage = event => finish(JSON.parse(event.data));
+        watcher.source.onerror = () => {
+            closeSource();
+            if (!watcher.stopped) poll();
+        };
+    } else {
+        poll();
+    }
+    return watcher;
+}
+
 function createTableElement(data) {
     if (!data) return null;
 
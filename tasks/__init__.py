@@ -1,10 +1,12 @@
 from tasks.workers import (
+    _run_pdf_processing,
     _run_summary_generation,
     _run_transcript_generation,
     _run_podcast_generation,
 )
 
 __all__ = [
+    "_run_pdf_processing",
     "_run_summary_generation",
     "_run_transcript_generation",
     "_run_podcast_generation",
@@ -1,11 +1,41 @@
-import json
+import hashlib
 import os
-import re
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from flask import url_for
-from database import db, PDFFile, Task, get_settings
-from services import generate_text_with_file, generate_podcast_audio
+from sqlalchemy.exc import IntegrityError
+from config import config
+from database import (
+    db,
+    PDFFile,
+    PDFElement,
+    Task,
+    SummaryCache,
+    TranscriptCache,
+    ChatResponseCache,
+    get_settings,
+    pdf_element_dicts,
+    pdf_element_rows,
+    pdf_storage_stem,
+    release_connection,
+)
+from services import (
+    TTS_MODEL,
+    generate_text_with_file,
+    generate_text_stream,
+    generate_podcast_audio,
+    iter_dialogue,
+    parse_dialogue,
+    synthesize_dialogue,
+    process_pdf,
+    extract_pdf_text,
+    figure_dir_path,
+    reuse_pdf_elements,
+)
 from ragflow_service import get_ragflow_client
-from utils.audio import get_audio_filename
+from utils import fastjson
+from utils.audio import get_audio_filename, encode_podcast
+from utils.cache import document_content_cache, document_content_key
 from utils.task_queue import TaskStatus
 
 COMMON_TOPICS = [
@@ -48,6 +78,27 @@ COMMON_TOPICS = [
 ]
 
 
+# Jobs started from requests share one bounded pool, so a burst of clicks
+# queues up instead of each starting its own thread, PDF extraction or encode
+_background_jobs = ThreadPoolExecutor(
+    max_workers=config.BACKGROUND_WORKERS, thread_name_prefix="background-job"
+)
+
+
+def run_in_background(target, *args):
+    """Run a worker function such as _run_summary_generation on the job pool."""
+    return _background_jobs.submit(target, *args)
+
+
+def shutdown_background_jobs():
+    """
+    Stop taking new jobs and wait for the queued ones, so an upload or
+    generation that was accepted still records its result before the
+    process exits.
+    """
+    _background_jobs.shutdown(wait=True)
+
+
 def extract_tags_from_summary(summary_text):
     """Extract tags from summary using keyword matching."""
     if not summary_text:
@@ -78,19 +129,38 @@ def _get_document_content(pdf_file, settings):
 
     # Try fetching from Ragflow if backed by Ragflow
     if pdf_file.is_ragflow_backed:
-        logger.info(f"File {pdf_file.id} is Ragflow-backed, fetching content...")
-        client = get_ragflow_client(settings)
-        if client:
-            try:
-                content = client.get_document_content(
-                    pdf_file.ragflow_dataset_id, pdf_file.ragflow_document_id
-                )
-                if content:
-                    logger.info(f"Fetched from Ragflow, content length: {len(content)}")
-                    return content
-            except Exception as e:
-                logger.error(f"Error fetching from Ragflow: {e}")
-                raise Exception(f"Failed to fetch document from Ragflow: {e}")
+        key = document_content_key(
+            pdf_file.ragflow_dataset_id, pdf_file.ragflow_document_id
+        )
+        content = document_content_cache.get(key)
+        if content:
+            logger.info(f"Using cached Ragflow content for file {pdf_file.id}")
+            return content
+
+        # Summary, transcript and chat often start together on a new file;
+        # only the first of them downloads it
+        with document_content_cache.lock_for(key):
+            content = document_content_cache.get(key)
+            if content:
+                logger.info(f"Using cached Ragflow content for file {pdf_file.id}")
+                return content
+
+            logger.info(f"File {pdf_file.id} is Ragflow-backed, fetching content...")
+            client = get_ragflow_client(settings)
+            if client:
+                try:
+                    content = client.get_document_content(
+                        pdf_file.ragflow_dataset_id, pdf_file.ragflow_document_id
+                    )
+                    if content:
+                        logger.info(
+                            f"Fetched from Ragflow, content length: {len(content)}"
+                        )
+                        document_content_cache.set(key, content)
+                        return content
+                except Exception as e:
+                    logger.error(f"Error fetching from Ragflow: {e}")
+                    raise Exception(f"Failed to fetch document from Ragflow: {e}")
 
     logger.warning(
         f"No content found for file {pdf_file.id} - text: {bool(pdf_file.text)}, is_ragflow_backed: {pdf_file.is_ragflow_backed}"
@@ -100,7 +170,287 @@ def _get_document_content(pdf_file, settings):
     )
 
 
-def _run_summary_generation(app, task_id, file_id):
+TRANSCRIPT_LENGTH_GUIDANCE = {
+    "short": "Keep the script brief, approximately 2-3 minutes of dialogue.",
+    "medium": "Create a moderate-length script, approximately 5-7 minutes of dialogue.",
+    "long": "Create a comprehensive, detailed script approximately 10+ minutes of dialogue.",
+}
+
+
+def _transcript_prompt(settings):
+    """Return the transcript prompt with the configured length instruction."""
+    transcript_len = getattr(settings, "transcript_length", "medium")
+    length_instruction = TRANSCRIPT_LENGTH_GUIDANCE.get(
+        transcript_len, TRANSCRIPT_LENGTH_GUIDANCE["medium"]
+    )
+    return f"{settings.transcript_prompt}\n\n{length_instruction}"
+
+
+def _generation_cache_key(pdf_file, model, prompt):
+    """Return the cache lookup columns for a file, or None if unhashed."""
+    if not pdf_file.content_hash:
+        return None
+    return {
+        "content_hash": pdf_file.content_hash,
+        "model": model,
+        "prompt_hash": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+    }
+
+
+def _summary_cache_key(pdf_file, settings):
+    return _generation_cache_key(
+        pdf_file, settings.summary_model, settings.summary_prompt
+    )
+
+
+def _get_cached_summary(pdf_file, settings):
+    """Return a summary previously generated for identical PDF bytes, if any."""
+    key = _summary_cache_key(pdf_file, settings)
+    if not key:
+        return None
+    entry = SummaryCache.query.filter_by(**key).first()
+    return entry.summary if entry else None
+
+
+def _cache_summary(pdf_file, settings, summary):
+    """Remember a generated summary for this file's content, model and prompt."""
+    key = _summary_cache_key(pdf_file, settings)
+    if not key or not summary:
+        return
+    entry = SummaryCache.query.filter_by(**key).first()
+    if entry:
+        entry.summary = summary
+    else:
+        db.session.add(SummaryCache(summary=summary, **key))
+
+
+def _chat_request_hash(model, messages):
+    """
+    Hash the model and every message sent to it, so a reply is only reused
+    for the same document, context, history and question.
+    """
+    return hashlib.sha256(
+        fastjson.dumps({"model": model, "messages": messages}).encode("utf-8")
+    ).hexdigest()
+
+
+def _get_cached_chat_response(request_hash):
+    entry = ChatResponseCache.query.filter_by(request_hash=request_hash).first()
+    return entry.response if entry else None
+
+
+def _cache_chat_response(request_hash, response_text):
+    """
+    Remember a chat reply, dropping the oldest beyond CHAT_CACHE_MAX_ROWS.
+
+    Two identical requests in flight both miss the cache; the second one's
+    row is skipped rather than failing on the unique request_hash index.
+    """
+    if not response_text or _get_cached_chat_response(request_hash) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(
+                ChatResponseCache(request_hash=request_hash, response=response_text)
+            )
+    except IntegrityError:
+        return  # An identical request cached its reply in between
+    stale_ids = (
+        db.select(ChatResponseCache.id)
+        .order_by(ChatResponseCache.created_at.desc(), ChatResponseCache.id.desc())
+        .offset(config.CHAT_CACHE_MAX_ROWS)
+    )
+    db.session.execute(
+        db.delete(ChatResponseCache).where(ChatResponseCache.id.in_(stale_ids))
+    )
+
+
+TRANSCRIPT_SYSTEM_PROMPT = "You are a helpful research assistant that creates engaging podcast scripts from documents."
+
+
+def _cached_transcript(pdf_file, settings):
+    """Return (cache key, script made for identical PDF bytes or None)."""
+    prompt = _transcript_prompt(settings)
+    key = _generation_cache_key(pdf_file, settings.transcript_model, prompt)
+    entry = TranscriptCache.query.filter_by(**key).first() if key else None
+    return key, entry.transcript if entry else None
+
+
+def _cache_transcript(key, transcript):
+    """Remember a generated script under key, replacing an older one."""
+    entry = TranscriptCache.query.filter_by(**key).first()
+    if entry:
+        entry.transcript = transcript
+    else:
+        db.session.add(TranscriptCache(transcript=transcript, **key))
+
+
+def _generate_transcript(app, task_id, pdf_file, settings, force=False):
+    """
+    Write a podcast script, reusing one made for identical PDF bytes unless
+    force is set.
+    """
+    key, transcript_text = _cached_transcript(pdf_file, settings)
+    if transcript_text and not force:
+        app.logger.info(
+            f"Task {task_id}: Reusing cached transcript for identical content"
+        )
+        return transcript_text
+
+    transcript_text = _generate_from_document(
+        app,
+        task_id,
+        pdf_file,
+        settings,
+        settings.transcript_model,
+        _transcript_prompt(settings),
+        TRANSCRIPT_SYSTEM_PROMPT,
+    )
+    if key and transcript_text:
+        _cache_transcript(key, transcript_text)
+    return transcript_text
+
+
+def _token_lines(tokens, full_text_parts):
+    """
+    Regroup streamed tokens into lines, recording every token in
+    full_text_parts for the final "".join().
+    """
+    line = ""
+    for token in tokens:
+        full_text_parts.append(token)
+        *lines, line = (line + token).split("\n")
+        yield from lines
+    yield line
+
+
+def _stream_transcript_podcast(
+    app, task_id, pdf_file, settings, host_voice, expert_voice, mp3_filepath
+):
+    """
+    Stream a new podcast script from the text model and voice it meanwhile.
+
+    Each Host/Expert turn goes to TTS as soon as the next turn starts, so the
+    audio is nearly finished when the script is. Returns the transcript.
+    """
+    if not hasattr(app, "text_client") or not app.text_client:
+        raise Exception(
+            "NanoGPT text client not initialized. Please set API key in settings."
+        )
+
+    release_connection()
+    document_content = _get_document_content(pdf_file, settings)
+    app.logger.info(
+        f"Task {task_id}: Streaming transcript from {settings.transcript_model} into TTS..."
+    )
+    full_text_parts = []
+    tokens = generate_text_stream(
+        app.text_client,
+        settings.transcript_model,
+        document_content,
+        _transcript_prompt(settings),
+        TRANSCRIPT_SYSTEM_PROMPT,
+    )
+    segments = iter_dialogue(_token_lines(tokens, full_text_parts))
+    try:
+        encode_podcast(
+            synthesize_dialogue(app.tts_client, segments, host_voice, expert_voice),
+            mp3_filepath,
+        )
+    except Exception:
+        transcript_text = "".join(full_text_parts)
+        if transcript_text and not parse_dialogue(transcript_text):
+            raise Exception(
+                "Generated transcript has no 'Host:'/'Expert:' dialogue lines."
+            )
+        raise
+    return "".join(full_text_parts)
+
+
+def _podcast_audio_hash(transcript, host_voice, expert_voice):
+    """Hash everything the podcast MP3 depends on."""
+    return hashlib.sha256(
+        fastjson.dumps(
+            {
+                "transcript": transcript,
+                "host_voice": host_voice,
+                "expert_voice": expert_voice,
+                "model": TTS_MODEL,
+            }
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def _reuse_extraction(app, task_id, filepath, content_hash):
+    """
+    Take figures and tables from an earlier upload of the same PDF bytes.
+
+    Only the cheap text pass is redone. Returns None when nothing usable was
+    found, in which case the caller runs the full extraction.
+    """
+    if not content_hash:
+        return None
+
+    previous = (
+        db.session.query(PDFFile.id, PDFFile.filename, PDFFile.storage_name)
+        .filter_by(content_hash=content_hash)
+        .order_by(PDFFile.id.desc())
+        .first()
+    )
+    if not previous:
+        return None
+
+    previous_figures = figure_dir_path(pdf_storage_stem(previous))
+    try:
+        elements = reuse_pdf_elements(
+            pdf_element_dicts(previous.id, previous_figures), filepath
+        )
+    except FileNotFoundError as e:
+        app.logger.warning(
+            f"Task {task_id}: Figures of {previous.filename} are missing ({e}), re-extracting"
+        )
+        return None
+
+    app.logger.info(
+        f"Task {task_id}: Same content as {previous.filename}, reusing its figures and tables"
+    )
+    return extract_pdf_text(filepath), elements
+
+
+def _reuse_ragflow_document(app, task_id, client, ragflow_dataset, content_hash):
+    """
+    Find a Ragflow document already holding the same PDF bytes in the dataset.
+
+    Returns its document ID, or None when the PDF has to be uploaded.
+    """
+    if not content_hash:
+        return None
+
+    previous = (
+        db.session.query(PDFFile.filename, PDFFile.ragflow_document_id)
+        .filter(
+            PDFFile.content_hash == content_hash,
+            PDFFile.ragflow_dataset_id == ragflow_dataset,
+            PDFFile.ragflow_document_id.isnot(None),
+        )
+        .order_by(PDFFile.id.desc())
+        .first()
+    )
+    if not previous or not client.document_exists(
+        ragflow_dataset, previous.ragflow_document_id
+    ):
+        return None
+
+    app.logger.info(
+        f"Task {task_id}: Same content as {previous.filename}, reusing its Ragflow document"
+    )
+    return previous.ragflow_document_id
+
+
+def _run_pdf_processing(
+    app, task_id, filepath, filename, ragflow_dataset, content_hash=None
+):
+    """Extract a freshly uploaded PDF, push it to Ragflow and create its row."""
     with app.app_context():
         try:
             task = Task.query.get(task_id)
@@ -108,56 +458,262 @@ def _run_summary_generation(app, task_id, file_id):
                 app.logger.error(f"Task {task_id} not found in database.")
                 return
 
-            pdf_file = PDFFile.query.get(file_id)
             settings = get_settings()
-
-            if not hasattr(app, "text_client") or not app.text_client:
+            client = get_ragflow_client(settings)
+            if not client:
                 raise Exception(
-                    "NanoGPT text client not initialized. Please set API key in settings."
+                    "Ragflow not configured. Please set up Ragflow in settings."
                 )
 
-            # Get content (from local or Ragflow)
-            document_content = _get_document_content(pdf_file, settings)
-
-            if not document_content:
-                raise Exception(
-                    "No document content available - _get_document_content returned empty"
+            # The dataset name doesn't depend on the PDF, so look it up while the
+            # PDF is being extracted and uploaded
+            dataset_lookup = ThreadPoolExecutor(max_workers=1)
+            dataset_future = dataset_lookup.submit(client.get_dataset, ragflow_dataset)
+            dataset_lookup.shutdown(wait=False)
+
+            extracted = _reuse_extraction(app, task_id, filepath, content_hash)
+            if extracted is None:
+                # Extraction can take minutes; nothing is written until the
+                # row is created at the end
+                release_connection()
+                app.logger.info(f"Task {task_id}: Processing PDF {filename}...")
+                extracted = process_pdf(filepath)
+            text, elements = extracted
+
+            markdown_content = f"# {filename}\n\n{text}"
+            ragflow_document_id = _reuse_ragflow_document(
+                app, task_id, client, ragflow_dataset, content_hash
+            )
+            if not ragflow_document_id:
+                markdown_name = f"{filename.rsplit('.', 1)[0]}.md"
+                release_connection()
+                result = client.request(
+                    "POST",
+                    f"/datasets/{ragflow_dataset}/documents",
+                    files={"file": (markdown_name, markdown_content.encode("utf-8"))},
                 )
 
-            app.logger.info(
-                f"Task {task_id}: Document content length: {len(document_content)} chars"
-            )
-            app.logger.info(
-                f"Task {task_id}: is_ragflow_backed: {pdf_file.is_ragflow_backed}"
+                ragflow_document_id = (
+                    result.get("data", {}).get("document", {}).get("id")
+                )
+                if not ragflow_document_id:
+                    app.logger.error(
+                        f"Task {task_id}: Ragflow upload response missing document ID: {result}"
+                    )
+                    raise Exception("Failed to get document ID from Ragflow")
+
+            dataset_info = dataset_future.result() or {}
+            ragflow_dataset_name = dataset_info.get("name", "Unknown Dataset")
+
+            new_file = PDFFile(
+                filename=filename,
+                # The upload was saved under the file's storage name
+                storage_name=os.path.splitext(os.path.basename(filepath))[0],
+                text=None,
+                figures=None,
+                captions=None,
+                ragflow_document_id=ragflow_document_id,
+                ragflow_dataset_id=ragflow_dataset,
+                ragflow_dataset_name=ragflow_dataset_name,
+                content_hash=content_hash,
             )
-            app.logger.info(
-                f"Task {task_id}: ragflow_dataset_id: {pdf_file.ragflow_dataset_id}"
+            db.session.add(new_file)
+            db.session.flush()
+
+            element_rows = pdf_element_rows(new_file.id, elements)
+            if element_rows:
+                db.session.execute(db.insert(PDFElement), element_rows)
+
+            task.status = TaskStatus.COMPLETE
+            task.result = fastjson.dumps({"success": True, "file_id": new_file.id})
+            db.session.commit()
+
+            # Summaries usually follow an upload straight away; serve them the
+            # text we just sent instead of downloading it back from Ragflow
+            document_content_cache.set(
+                document_content_key(ragflow_dataset, ragflow_document_id),
+                markdown_content,
             )
             app.logger.info(
-                f"Task {task_id}: ragflow_document_id: {pdf_file.ragflow_document_id}"
+                f"Task {task_id}: Uploaded {filename} to Ragflow as file_id {new_file.id}."
             )
 
-            prompt = settings.summary_prompt
-            model_name = settings.summary_model
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Task {task_id}: Error processing upload {filename}: {e}")
+            task = Task.query.get(task_id)
+            if task:
+                task.status = TaskStatus.ERROR
+                task.result = fastjson.dumps({"error": f"Failed to upload: {str(e)}"})
+                db.session.commit()
+
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
 
-            app.logger.info(f"Task {task_id}: Generating summary with {model_name}...")
 
-            response_text = generate_text_with_file(
-                app.text_client,
-                model_name,
-                document_content,
-                prompt,
-                "You are a helpful research assistant that summarizes documents clearly.",
+# Files of a batch upload in flight at once, so one file's Ragflow upload
+# overlaps the next file's extraction
+PDF_BATCH_PIPELINE = 2
+
+
+def _run_pdf_batch(app, jobs, ragflow_dataset):
+    """Process a batch upload; jobs are (task_id, filepath, filename, hash)."""
+
+    def process(job):
+        task_id, filepath, filename, content_hash = job
+        _run_pdf_processing(
+            app, task_id, filepath, filename, ragflow_dataset, content_hash
+        )
+
+    with ThreadPoolExecutor(max_workers=PDF_BATCH_PIPELINE) as executor:
+        list(executor.map(process, jobs))
+
+
+def _generate_from_document(
+    app, task_id, pdf_file, settings, model_name, prompt, system_prompt
+):
+    """
+    Run a prompt over a file's content with the text model.
+
+    Summaries and transcripts both go through here, so content fetched from
+    Ragflow for one is served from document_content_cache to the other.
+    """
+    if not hasattr(app, "text_client") or not app.text_client:
+        raise Exception(
+            "NanoGPT text client not initialized. Please set API key in settings."
+        )
+
+    # Nothing is written until the model answers
+    release_connection()
+
+    # Get content (from local or Ragflow)
+    document_content = _get_document_content(pdf_file, settings)
+
+    if not document_content:
+        raise Exception(
+            "No document content available - _get_document_content returned empty"
+        )
+
+    app.logger.info(
+        f"Task {task_id}: Document content length: {len(document_content)} chars"
+    )
+    app.logger.info(f"Task {task_id}: Generating with {model_name}...")
+
+    return generate_text_with_file(
+        app.text_client, model_name, document_content, prompt, system_prompt
+    )
+
+
+def _generate_summary(app, task_id, pdf_file, settings):
+    """Fetch the document content and ask the text model for a summary."""
+    return _generate_from_document(
+        app,
+        task_id,
+        pdf_file,
+        settings,
+        settings.summary_model,
+        settings.summary_prompt,
+        "You are a helpful research assistant that summarizes documents clearly.",
+    )
+
+
+def _save_summary(pdf_file, summary):
+    """Set a file's summary and the tags listed in it; returns the tags."""
+    pdf_file.summary = summary
+    tags = extract_tags_from_summary(summary)
+    if tags:
+        pdf_file.tags = fastjson.dumps(tags)
+    return tags
+
+
+def _podcast_voices(settings):
+    """(host, expert) voices for podcasts, with the defaults filled in."""
+    return (
+        settings.tts_host_voice or "af_bella",
+        settings.tts_expert_voice or "am_onyx",
+    )
+
+
+def _force_requested(task):
+    """Whether a queued job was started with force=1 to skip reusable results."""
+    try:
+        task_data = fastjson.loads(task.result) if task.result else {}
+    except ValueError:
+        return False  # Not queue metadata, e.g. a plain status string
+    return isinstance(task_data, dict) and bool(
+        task_data.get("metadata", {}).get("force")
+    )
+
+
+def _reuse_generation(task_type, pdf_file, settings):
+    """
+    Finish a job straight away when its result needs no model or TTS call:
+    a summary or script cached for identical PDF bytes, or a podcast that is
+    already up to date.
+
+    Returns the task result, or None when the job has to be queued. The
+    caller commits.
+    """
+    if task_type == "summary":
+        summary = _get_cached_summary(pdf_file, settings)
+        if not summary:
+            return None
+        _save_summary(pdf_file, summary)
+        return {"success": True}
+
+    if task_type == "transcript":
+        _, transcript = _cached_transcript(pdf_file, settings)
+        if not transcript:
+            return None
+        pdf_file.transcript = transcript
+        return {"success": True, "transcript": transcript}
+
+    if task_type == "podcast":
+        if not (pdf_file.transcript and pdf_file.audio_generated_at):
+            return None
+        audio_hash = _podcast_audio_hash(
+            pdf_file.transcript, *_podcast_voices(settings)
+        )
+        if pdf_file.audio_hash != audio_hash:
+            return None
+        return {
+            "audio_url": url_for(
+                "static.stream_audio",
+                file_id=pdf_file.id,
+                v=pdf_file.audio_version,
             )
+        }
+
+    return None
+
+
+def _run_summary_generation(app, task_id, file_id):
+    with app.app_context():
+        try:
+            task = Task.query.get(task_id)
+            if not task:
+                app.logger.error(f"Task {task_id} not found in database.")
+                return
 
-            pdf_file.summary = response_text
+            pdf_file = PDFFile.query.get(file_id)
+            settings = get_settings()
 
-            tags = extract_tags_from_summary(response_text)
-            if tags:
-                pdf_file.tags = json.dumps(tags)
+            response_text = None
+            if not _force_requested(task):
+                response_text = _get_cached_summary(pdf_file, settings)
+            if response_text:
+                app.logger.info(
+                    f"Task {task_id}: Reusing cached summary for identical content"
+                )
+            else:
+                response_text = _generate_summary(app, task_id, pdf_file, settings)
+                _cache_summary(pdf_file, settings, response_text)
+
+            tags = _save_summary(pdf_file, response_text)
 
             task.status = TaskStatus.COMPLETE
-            task.result = json.dumps({"success": True})
+            task.result = fastjson.dumps({"success": True})
             db.session.commit()
             app.logger.info(
                 f"Task {task_id}: Summary saved for file_id {file_id} with tags: {tags}"
@@ -171,7 +727,7 @@ def _run_summary_generation(app, task_id, file_id):
             task = Task.query.get(task_id)
             if task:
                 task.status = TaskStatus.ERROR
-                task.result = json.dumps({"error": str(e)})
+                task.result = fastjson.dumps({"error": str(e)})
                 db.session.commit()
 
 
@@ -186,43 +742,14 @@ def _run_transcript_generation(app, task_id, file_id):
             pdf_file = PDFFile.query.get(file_id)
             settings = get_settings()
 
-            if not hasattr(app, "text_client") or not app.text_client:
-                raise Exception(
-                    "NanoGPT text client not initialized. Please set API key in settings."
-                )
-
-            # Get content (from local or Ragflow)
-            document_content = _get_document_content(pdf_file, settings)
-
-            transcript_model_name = settings.transcript_model
-
-            length_guidance = {
-                "short": "Keep the script brief, approximately 2-3 minutes of dialogue.",
-                "medium": "Create a moderate-length script, approximately 5-7 minutes of dialogue.",
-                "long": "Create a comprehensive, detailed script approximately 10+ minutes of dialogue.",
-            }
-            transcript_len = getattr(settings, "transcript_length", "medium")
-            length_instruction = length_guidance.get(
-                transcript_len, length_guidance["medium"]
-            )
-            full_prompt = f"{settings.transcript_prompt}\n\n{length_instruction}"
-
-            app.logger.info(
-                f"Task {task_id}: Generating transcript with {transcript_model_name}..."
-            )
-
-            transcript_text = generate_text_with_file(
-                app.text_client,
-                transcript_model_name,
-                document_content,
-                full_prompt,
-                "You are a helpful research assistant that creates engaging podcast scripts from documents.",
+            transcript_text = _generate_transcript(
+                app, task_id, pdf_file, settings, force=_force_requested(task)
             )
 
             pdf_file.transcript = transcript_text
 
             task.status = TaskStatus.COMPLETE
-            task.result = json.dumps({"success": True, "transcript": transcript_text})
+            task.result = fastjson.dumps({"success": True, "transcript": transcript_text})
             db.session.commit()
             app.logger.info(f"Task {task_id}: Transcript saved for file_id {file_id}.")
 
@@ -234,7 +761,7 @@ def _run_transcript_generation(app, task_id, file_id):
             task = Task.query.get(task_id)
             if task:
                 task.status = TaskStatus.ERROR
-                task.result = json.dumps({"error": str(e)})
+                task.result = fastjson.dumps({"error": str(e)})
                 db.session.commit()
 
 
@@ -249,73 +776,88 @@ def _run_podcast_generation(app, task_id, file_id):
             pdf_file = PDFFile.query.get(file_id)
             settings = get_settings()
 
+            if not hasattr(app, "tts_client") or not app.tts_client:
+                raise Exception(
+                    "DeepInfra TTS client not initialized. Please set API key in settings."
+                )
+
+            force = _force_requested(task)
+            voiced = False
+            host_voice, expert_voice = _podcast_voices(settings)
+            mp3_filename = get_audio_filename(pdf_file)
+            mp3_filepath = os.path.join(
+                app.config["GENERATED_AUDIO_FOLDER"], mp3_filename
+            )
+
             if not pdf_file.transcript:
                 app.logger.info(
                     f"Task {task_id}: No transcript found, auto-generating..."
                 )
 
-                if not hasattr(app, "text_client") or not app.text_client:
-                    raise Exception(
-                        "NanoGPT text client not initialized. Please set API key in settings."
+                key, transcript_text = _cached_transcript(pdf_file, settings)
+                if transcript_text and not force:
+                    app.logger.info(
+                        f"Task {task_id}: Reusing cached transcript for identical content"
                     )
+                    # Reject a malformed script here rather than paying for TTS on it
+                    if not parse_dialogue(transcript_text):
+                        raise Exception(
+                            "Generated transcript has no 'Host:'/'Expert:' dialogue lines."
+                        )
+                else:
+                    transcript_text = _stream_transcript_podcast(
+                        app,
+                        task_id,
+                        pdf_file,
+                        settings,
+                        host_voice,
+                        expert_voice,
+                        mp3_filepath,
+                    )
+                    if key:
+                        _cache_transcript(key, transcript_text)
+                    # The MP3 was written alongside the script; nothing left to voice
+                    pdf_file.audio_hash = _podcast_audio_hash(
+                        transcript_text, host_voice, expert_voice
+                    )
+                    pdf_file.audio_generated_at = datetime.utcnow()
+                    voiced = True
 
-                # Get content from Ragflow or local
-                document_content = _get_document_content(pdf_file, settings)
-
-                transcript_model_name = settings.transcript_model
-
-                length_guidance = {
-                    "short": "Keep the script brief, approximately 2-3 minutes of dialogue.",
-                    "medium": "Create a moderate-length script, approximately 5-7 minutes of dialogue.",
-                    "long": "Create a comprehensive, detailed script approximately 10+ minutes of dialogue.",
-                }
-                transcript_len = getattr(settings, "transcript_length", "medium")
-                length_instruction = length_guidance.get(
-                    transcript_len, length_guidance["medium"]
-                )
-                full_prompt = f"{settings.transcript_prompt}\n\n{length_instruction}"
-
-                transcript_text = generate_text_with_file(
-                    app.text_client,
-                    transcript_model_name,
-                    document_content,
-                    full_prompt,
-                    "You are a helpful research assistant that creates engaging podcast scripts from documents.",
-                )
-
+                # Committed with the task's result, or before voicing it below
                 pdf_file.transcript = transcript_text
-                db.session.commit()
                 app.logger.info(
                     f"Task {task_id}: Auto-generated transcript for file_id {file_id}."
                 )
 
-            if not hasattr(app, "tts_client") or not app.tts_client:
-                raise Exception(
-                    "DeepInfra TTS client not initialized. Please set API key in settings."
-                )
-
             transcript = pdf_file.transcript
-            app.logger.info(
-                f"Task {task_id}: Generating audio from transcript for file {file_id} using DeepInfra Kokoro..."
-            )
+            audio_hash = _podcast_audio_hash(transcript, host_voice, expert_voice)
 
-            host_voice = settings.tts_host_voice or "af_bella"
-            expert_voice = settings.tts_expert_voice or "am_onyx"
-
-            combined_audio = generate_podcast_audio(
-                app.tts_client, transcript, host_voice, expert_voice, speed=1.0
+            up_to_date = pdf_file.audio_hash == audio_hash and os.path.exists(
+                mp3_filepath
             )
+            if up_to_date and (voiced or not force):
+                app.logger.info(
+                    f"Task {task_id}: Audio for file {file_id} is already up to date"
+                )
+            else:
+                app.logger.info(
+                    f"Task {task_id}: Generating audio from transcript for file {file_id} using DeepInfra Kokoro..."
+                )
+                release_connection()
+                # Segments are encoded as they arrive rather than joined first
+                audio_chunks = generate_podcast_audio(
+                    app.tts_client, transcript, host_voice, expert_voice, speed=1.0
+                )
+                encode_podcast(audio_chunks, mp3_filepath)
+                pdf_file.audio_hash = audio_hash
+                pdf_file.audio_generated_at = datetime.utcnow()
 
-            mp3_filename = get_audio_filename(pdf_file)
-            mp3_filepath = os.path.join(
-                app.config["GENERATED_AUDIO_FOLDER"], mp3_filename
+            audio_url = url_for(
+                "static.stream_audio", file_id=file_id, v=pdf_file.audio_version
             )
-            combined_audio.export(mp3_filepath, format="mp3")
-
-            audio_url = url_for("generated_audio", filename=mp3_filename)
 
             task.status = TaskStatus.COMPLETE
-            task.result = json.dumps({"audio_url": audio_url})
+            task.result = fastjson.dumps({"audio_url": audio_url})
             db.session.commit()
             app.logger.info(
                 f"Task {task_id}: Podcast audio saved for file_id {file_id}."
@@ -329,5 +871,5 @@ def _run_podcast_generation(app, task_id, file_id):
             task = Task.query.get(task_id)
             if task:
                 task.status = TaskStatus.ERROR
-                task.result = json.dumps({"error": str(e)})
+                task.result = fastjson.dumps({"error": str(e)})
                 db.session.commit()
@@ -9,17 +9,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 @pytest.fixture
 def app():
     """Create and configure a test instance of the app."""
-    from app import app as _app
-
-    _app.config["TESTING"] = True
-    _app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-    _app.config["WTF_CSRF_ENABLED"] = False
-
-    with _app.app_context():
-        from database import db
-
-        db.init_app(_app)
-        db.create_all()
+    from app import create_app
+
+    _app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_ENGINE_OPTIONS": {},
+            "WTF_CSRF_ENABLED": False,
+            "SECRET_KEY": "test",
+        }
+    )
 
     yield _app
 
@@ -77,6 +77,37 @@ class TestSettings:
         )
         assert response.status_code == 200
 
+    def test_settings_cached_until_saved(self, app, client):
+        """Test settings are read once, and a saved change is seen at once."""
+        from sqlalchemy import event
+
+        from database import db, get_settings
+
+        with app.app_context():
+            get_settings()
+
+        statements = []
+        with app.app_context():
+            event.listen(
+                db.engine,
+                "before_cursor_execute",
+                lambda *args: statements.append(args[2]),
+            )
+        with app.app_context():
+            assert get_settings().summary_prompt != "Cached prompt"
+        assert not [sql for sql in statements if "settings" in sql.lower()]
+
+        client.post(
+            "/settings",
+            data={
+                "summary_prompt": "Cached prompt",
+                "transcript_prompt": "Test transcript",
+                "transcript_length": "medium",
+            },
+        )
+        with app.app_context():
+            assert get_settings().summary_prompt == "Cached prompt"
+
 
 class TestFileUpload:
     """Tests for file upload functionality."""
@@ -87,6 +118,62 @@ class TestFileUpload:
         # Should redirect or return error
         assert response.status_code in [302, 400]
 
+    def test_upload_stream_requires_pdf_name(self, client):
+        """Test a raw upload without a .pdf X-Filename is rejected."""
+        response = client.post(
+            "/upload_stream",
+            data=b"%PDF-1.4",
+            headers={"X-Filename": "notes.txt", "X-Ragflow-Dataset": "ds"},
+        )
+        assert response.status_code == 400
+
+    def test_upload_status_while_processing(self, app, client):
+        """Test upload_status reports a running upload task and keeps it."""
+        from database import db, Task
+
+        with app.app_context():
+            db.session.add(Task(id="uploading", status="processing"))
+            db.session.commit()
+
+        response = client.get("/upload_status/uploading")
+        assert response.get_json()["status"] == "processing"
+        assert client.get("/upload_status/uploading").status_code == 200
+
+    def test_upload_chunk_requires_issued_id(self, client):
+        """Test chunks for an id the server never issued are refused."""
+        response = client.get("/upload_chunk/" + "0" * 32)
+        assert response.status_code == 404
+
+    def test_upload_chunk_checks_range_and_length(self, app, client, monkeypatch):
+        """Test a chunk must carry exactly the bytes its Content-Range names."""
+        import routes.files
+
+        monkeypatch.setattr(routes.files, "get_ragflow_client", lambda s: object())
+        headers = {"X-Filename": "paper.pdf", "X-Ragflow-Dataset": "ds"}
+        started = client.post("/upload_chunk", headers=headers)
+        assert started.status_code == 201
+        upload_id = started.get_json()["upload_id"]
+        part_path = os.path.join(
+            app.config["UPLOAD_FOLDER"], f".chunked-{upload_id}.part"
+        )
+        try:
+            for content_range in ("bytes 5-2/16", "bytes 0-9/16"):
+                response = client.post(
+                    f"/upload_chunk/{upload_id}",
+                    data=b"%PDF-1.4",
+                    headers={**headers, "Content-Range": content_range},
+                )
+                assert response.status_code == 400
+            response = client.post(
+                f"/upload_chunk/{upload_id}",
+                data=b"%PDF-1.4",
+                headers={**headers, "Content-Range": "bytes 0-7/16"},
+            )
+            assert response.status_code == 308
+            assert response.get_json()["received"] == 8
+        finally:
+            os.remove(part_path)
+
 
 class TestAPIEndpoints:
     """Tests for API endpoints."""
@@ -106,6 +193,304 @@ class TestAPIEndpoints:
         response = client.delete("/delete_file/99999")
         assert response.status_code == 404
 
+    def test_delete_files_requires_id_list(self, client):
+        """Test delete_files rejects a body without a list of ids."""
+        response = client.post("/delete_files", json={"ids": "1"})
+        assert response.status_code == 400
+
+    def test_delete_files_bulk(self, app, client):
+        """Test delete_files removes every listed file in one request."""
+        from database import db, PDFFile
+
+        with app.app_context():
+            db.session.add_all([PDFFile(filename=f"bulk{i}.pdf") for i in range(3)])
+            db.session.commit()
+            ids = [f.id for f in PDFFile.query.all()]
+
+        response = client.post("/delete_files", json={"ids": ids + [99999]})
+        assert response.status_code == 200
+        assert sorted(response.get_json()["deleted"]) == sorted(ids)
+        with app.app_context():
+            assert PDFFile.query.count() == 0
+
+    def test_generation_rejected_when_queue_full(self, app, client):
+        """Test a generation request is turned away once the queue is full."""
+        from database import db, PDFFile
+
+        with app.app_context():
+            pdf_file = PDFFile(filename="queued.pdf")
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id = pdf_file.id
+
+        app.config["TASK_QUEUE_MAX_PENDING"] = 0
+        response = client.post(f"/summarize_file/{file_id}")
+        assert response.status_code == 429
+
+    def test_podcast_up_to_date_finishes_without_task(self, app, client):
+        """Test an up-to-date podcast is answered directly, with no task queued."""
+        from datetime import datetime
+
+        from database import db, PDFFile, Task, get_settings
+        from tasks.workers import _podcast_audio_hash, _podcast_voices
+
+        with app.app_context():
+            transcript = "Host: Hi\nExpert: Hello"
+            pdf_file = PDFFile(
+                filename="voiced.pdf",
+                transcript=transcript,
+                audio_hash=_podcast_audio_hash(
+                    transcript, *_podcast_voices(get_settings())
+                ),
+                audio_generated_at=datetime.utcnow(),
+            )
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id = pdf_file.id
+
+        response = client.post(f"/generate_podcast/{file_id}")
+        assert response.status_code == 200
+        assert response.get_json()["status"] == "complete"
+        with app.app_context():
+            assert Task.query.count() == 0
+
+    def test_force_skips_reused_results(self, app, client, monkeypatch):
+        """Test ?force=1 queues a fresh job that ignores the summary cache."""
+        import tasks.workers
+        from database import db, PDFFile
+        from utils.task_queue import get_task_queue
+
+        monkeypatch.setattr(get_task_queue(), "start_workers", lambda app: None)
+        monkeypatch.setattr(tasks.workers, "_get_cached_summary", lambda f, s: "Old")
+        monkeypatch.setattr(tasks.workers, "_generate_summary", lambda *args: "New")
+        with app.app_context():
+            pdf_file = PDFFile(filename="forced.pdf")
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id = pdf_file.id
+
+        assert client.post(f"/summarize_file/{file_id}").status_code == 200
+        response = client.post(f"/summarize_file/{file_id}?force=1")
+        assert response.status_code == 202
+        tasks.workers._run_summary_generation(
+            app, response.get_json()["task_id"], file_id
+        )
+        with app.app_context():
+            assert db.session.get(PDFFile, file_id).summary == "New"
+
+    def test_rename_file_keeps_storage_name(self, app, client):
+        """Test renaming only changes the row; stored files keep their names."""
+        from database import db, PDFFile
+        from utils.audio import get_audio_filename
+
+        with app.app_context():
+            pdf_file = PDFFile(filename="old.name.pdf")
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id = pdf_file.id
+            audio_filename = get_audio_filename(pdf_file)
+
+        response = client.post(f"/rename_file/{file_id}", json={"new_filename": "new"})
+        assert response.get_json()["new_filename"] == "new.pdf"
+        with app.app_context():
+            pdf_file = db.session.get(PDFFile, file_id)
+            assert pdf_file.storage_name == "old.name"
+            assert get_audio_filename(pdf_file) == audio_filename
+
+    def test_file_details_elements_cached_until_delete(self, app, client):
+        """Test a file's elements are read once and forgotten on delete."""
+        from database import db, PDFElement, PDFFile
+        from utils.cache import pdf_elements_cache
+
+        with app.app_context():
+            pdf_file = PDFFile(filename="tables.pdf", storage_name="tables")
+            db.session.add(pdf_file)
+            db.session.flush()
+            db.session.add(
+                PDFElement(
+                    file_id=pdf_file.id, order_idx=0, type="table", data='[["a", 1]]'
+                )
+            )
+            db.session.commit()
+            file_id = pdf_file.id
+
+        elements = client.get(f"/file_details/{file_id}").get_json()["elements"]
+        assert elements[0]["data"] == [["a", 1]]
+        assert pdf_elements_cache.get(file_id) is not None
+
+        client.delete(f"/delete_file/{file_id}")
+        assert pdf_elements_cache.get(file_id) is None
+
+    def test_task_stream_finished_task(self, app, client):
+        """Test task_stream sends a finished task's status and deletes it."""
+        from database import db, Task
+
+        with app.app_context():
+            db.session.add(Task(id="done", status="complete", result='{"ok":1}'))
+            db.session.commit()
+
+        response = client.get("/task_stream/done")
+        assert response.mimetype == "text/event-stream"
+        assert response.get_data(as_text=True) == (
+            'data: {"status":"complete","result":{"ok":1}}\n\n'
+        )
+        assert client.get("/task_stream/done").status_code == 404
+
+    def test_task_status_polls_skip_database_until_finished(self, app, client):
+        """Test running-task polls are served from memory until it finishes."""
+        from database import db, Task
+
+        with app.app_context():
+            db.session.add(Task(id="polled", status="processing"))
+            db.session.commit()
+        assert client.get("/summarize_status/polled").get_json()["status"] == (
+            "processing"
+        )
+
+        # A change the ORM didn't see (e.g. from another process) waits for
+        # the recheck; a committed finish is reported on the next poll
+        with app.app_context():
+            db.session.execute(
+                db.update(Task).where(Task.id == "polled").values(status="retrying")
+            )
+            db.session.commit()
+        assert client.get("/summarize_status/polled").get_json()["status"] == (
+            "processing"
+        )
+        with app.app_context():
+            task = db.session.get(Task, "polled")
+            task.status = "complete"
+            db.session.commit()
+        assert client.get("/summarize_status/polled").get_json()["status"] == (
+            "complete"
+        )
+        assert client.get("/summarize_status/polled").status_code == 404
+
+    def test_task_status_cache_follows_claims_and_stays_bounded(
+        self, app, client, monkeypatch
+    ):
+        """Test a claim's Core UPDATE refreshes polls and the cache is capped."""
+        import database
+        from database import db, Task
+        from utils.cache import LRUCache
+        from utils.task_queue import get_task_queue
+
+        with app.app_context():
+            db.session.add(Task(id="claimed", status="pending", result="{}"))
+            db.session.commit()
+        assert client.get("/summarize_status/claimed").get_json()["status"] == (
+            "pending"
+        )
+        with app.app_context():
+            assert get_task_queue().claim_task(db.session.get(Task, "claimed"))
+        response = client.get("/summarize_status/claimed").get_json()
+        assert response["status"] == "processing"
+        assert response["result"]["attempts"] == 1
+
+        monkeypatch.setattr(database, "_unfinished_task_statuses", LRUCache(2))
+        for task_id in ("a", "b", "c"):
+            database.remember_task_status(task_id, {"status": "processing"})
+        assert database.recent_task_status("a") is None
+        assert database.recent_task_status("c") == {"status": "processing"}
+
+    def test_stream_audio_range_from_disk(self, app, client):
+        """Test a podcast's MP3 is served from disk with Range support."""
+        from database import db, PDFFile
+        from utils.audio import get_audio_filename
+
+        with app.app_context():
+            pdf_file = PDFFile(filename="ranged.pdf", audio_hash="ab" * 32)
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id, version = pdf_file.id, pdf_file.audio_version
+            audio_dir = app.config["GENERATED_AUDIO_FOLDER"]
+            path = os.path.join(audio_dir, get_audio_filename(pdf_file))
+
+        os.makedirs(audio_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"ID3" + bytes(97))
+        try:
+            response = client.get(
+                f"/generated_audio/stream/{file_id}?v={version}",
+                headers={"Range": "bytes=0-2"},
+            )
+        finally:
+            os.remove(path)
+        assert response.status_code == 206
+        assert response.data == b"ID3"
+        assert response.headers["Content-Range"] == "bytes 0-2/100"
+        assert "immutable" in response.headers["Cache-Control"]
+
+    def test_chat_reply_kept_when_cache_row_exists(self, app, client, monkeypatch):
+        """Test a reply whose cache row was written meanwhile is still returned."""
+        import types
+
+        import routes.chat
+        import tasks.workers
+        from database import db, ChatResponseCache, PDFFile
+
+        def create(model, messages):
+            choice = types.SimpleNamespace(
+                message=types.SimpleNamespace(content="An answer")
+            )
+            return types.SimpleNamespace(choices=[choice])
+
+        app.text_client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        # Both requests miss the cache, as two identical ones in flight would
+        for module in (routes.chat, tasks.workers):
+            monkeypatch.setattr(module, "_get_cached_chat_response", lambda h: None)
+        with app.app_context():
+            pdf_file = PDFFile(filename="chat.pdf", text="Some text")
+            db.session.add(pdf_file)
+            db.session.commit()
+            file_id = pdf_file.id
+
+        for _ in range(2):
+            with app.app_context():
+                db.session.get(PDFFile, file_id).chat_history = None
+                db.session.commit()
+            response = client.post(f"/chat/{file_id}", json={"message": "Why?"})
+            assert response.status_code == 200
+            assert response.get_json()["message"] == "An answer"
+        with app.app_context():
+            assert ChatResponseCache.query.count() == 1
+            assert db.session.get(PDFFile, file_id).chat_history
+
+    def test_stored_file_handed_to_nginx_only_when_proxied(self, app, client):
+        """Test X-Accel-Redirect is used only for requests from a trusted proxy."""
+        upload_dir = app.config["UPLOAD_FOLDER"]
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, "accel-test.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4")
+        trusted = app.config["X_ACCEL_TRUSTED_PROXIES"]
+        app.config["X_ACCEL_REDIRECT_PREFIX"] = "/internal"
+        app.config["X_ACCEL_TRUSTED_PROXIES"] = {"10.0.0.2"}
+        try:
+            proxied = client.get(
+                "/uploads/accel-test.pdf", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+            )
+            direct = client.get(
+                "/uploads/accel-test.pdf", environ_base={"REMOTE_ADDR": "10.0.0.9"}
+            )
+            # A client can set forwarding headers itself; they are ignored
+            spoofed = client.get(
+                "/uploads/accel-test.pdf",
+                headers={"X-Forwarded-For": "10.0.0.2"},
+                environ_base={"REMOTE_ADDR": "10.0.0.9"},
+            )
+        finally:
+            app.config["X_ACCEL_REDIRECT_PREFIX"] = None
+            app.config["X_ACCEL_TRUSTED_PROXIES"] = trusted
+            os.remove(path)
+        assert proxied.headers["X-Accel-Redirect"] == "/internal/uploads/accel-test.pdf"
+        assert proxied.data == b""
+        for response in (direct, spoofed):
+            assert "X-Accel-Redirect" not in response.headers
+            assert response.data == b"%PDF-1.4"
+
 
 class TestErrorHandlers:
     """Tests for error handlers."""
@@ -127,3 +512,23 @@ class TestHealthCheck:
         """Test app has required config."""
         assert app.config["UPLOAD_FOLDER"] == "uploads"
         assert app.config["GENERATED_AUDIO_FOLDER"] == "generated_audio"
+
+    def test_sqlite_file_uses_wal(self, tmp_path):
+        """Test a file database is opened in WAL mode with relaxed fsyncs."""
+        from app import create_app
+        from database import db
+
+        _app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'wal.db'}",
+                "SQLALCHEMY_ENGINE_OPTIONS": {},
+                "SECRET_KEY": "test",
+            }
+        )
+        with _app.app_context():
+            with db.engine.connect() as connection:
+                pragma = connection.exec_driver_sql
+                assert pragma("PRAGMA journal_mode").scalar() == "wal"
+                assert pragma("PRAGMA synchronous").scalar() == 1
+            db.engine.dispose()
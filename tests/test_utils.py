@@ -1,5 +1,6 @@
 import pytest
 import os
+import shutil
 import sys
 
 # Add parent directory to path
@@ -132,3 +133,230 @@ class TestConfig:
         issues = Config.validate()
         # Should have no critical issues (folders may be created)
         assert isinstance(issues, list)
+
+
+class TestCaptionMatching:
+    """Tests for PDF caption matching helpers."""
+
+    def test_figure_caption_below_image(self):
+        """Test a figure caption directly below the image is found."""
+        import fitz
+        from services import _index_caption_blocks, _find_caption_below
+
+        blocks = [
+            (100, 20, 300, 40, "Intro paragraph\n", 0, 0),
+            (120, 230, 380, 245, "Figure 1: Results\n", 1, 0),
+            (120, 400, 380, 415, "Fig. 2: Far away\n", 2, 0),
+        ]
+        figure_captions, table_captions = _index_caption_blocks(blocks)
+
+        assert len(figure_captions) == 2
+        assert table_captions == []
+        caption = _find_caption_below(fitz.Rect(100, 50, 400, 200), figure_captions)
+        assert caption == "Figure 1: Results"
+
+    def test_table_caption_above_table(self):
+        """Test a table caption directly above the table is found."""
+        import fitz
+        from services import _index_caption_blocks, _find_caption_above
+
+        blocks = [(120, 80, 380, 95, "Table 2: Metrics\n", 0, 0)]
+        _, table_captions = _index_caption_blocks(blocks)
+
+        assert _find_caption_above(fitz.Rect(100, 100, 400, 300), table_captions) == (
+            "Table 2: Metrics"
+        )
+        assert _find_caption_above(fitz.Rect(500, 100, 600, 300), table_captions) == ""
+
+    def test_page_range_writes_captioned_images(self, tmp_path):
+        """Test captioned JPEG and PNG figures are kept and written to disk."""
+        import fitz
+        from services import _process_page_range, extract_pdf_text
+
+        def square(color):
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 120), False)
+            pixmap.set_rect(pixmap.irect, color)
+            return pixmap
+
+        jpeg_bytes = square((200, 30, 30)).tobytes("jpeg")
+        green = square((30, 200, 30))
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(72, 72, 192, 192), stream=jpeg_bytes)
+        page.insert_text((80, 210), "Figure 1: Red square")
+        page.insert_image(fitz.Rect(72, 300, 192, 420), stream=green.tobytes("png"))
+        page.insert_text((80, 438), "Figure 2: Green square")
+        # Small and uncaptioned, so it is skipped
+        page.insert_image(fitz.Rect(300, 600, 330, 630), pixmap=square((0, 0, 0)))
+        filepath = tmp_path / "figures.pdf"
+        doc.save(filepath)
+        figure_dir = tmp_path / "figures"
+        figure_dir.mkdir()
+
+        text, elements = _process_page_range(str(filepath), 0, 1, str(figure_dir))
+
+        assert "Figure 1: Red square" in text
+        assert extract_pdf_text(str(filepath)) == text
+        assert [(e["type"], e["caption"], e["page"]) for e in elements] == [
+            ("figure", "Figure 1: Red square", 1),
+            ("figure", "Figure 2: Green square", 1),
+        ]
+        jpeg_path, png_path = (e["path"] for e in elements)
+        # Plain JPEGs are written from the raw stream, byte for byte
+        assert jpeg_path.endswith(".jpeg")
+        with open(jpeg_path, "rb") as f:
+            assert f.read() == jpeg_bytes
+        assert png_path.endswith(".png")
+        assert fitz.Pixmap(png_path).samples == green.samples
+
+
+class TestDialogueParsing:
+    """Tests for splitting podcast transcripts into speaker turns."""
+
+    def test_speaker_turns(self):
+        """Test markdown-bold markers, continuation lines and empty turns."""
+        from services import parse_dialogue
+
+        transcript = "**Host:** Welcome\nto the show\n\nExpert: Thanks\nHost:\nExpert: Bye"
+        assert parse_dialogue(transcript) == [
+            ("host", "Welcome to the show"),
+            ("expert", "Thanks"),
+            ("expert", "Bye"),
+        ]
+
+    def test_no_speakers(self):
+        """Test text without speaker markers yields no segments."""
+        from services import parse_dialogue
+
+        assert parse_dialogue("Just a summary, not a dialogue.") == []
+
+    def test_streamed_tokens(self):
+        """Test turns parsed from streamed tokens match the whole transcript."""
+        from services import iter_dialogue, parse_dialogue
+        from tasks.workers import _token_lines
+
+        transcript = "Host: Welcome\nto the show\nExpert: Thanks\nHost: Bye"
+        tokens = [transcript[i : i + 3] for i in range(0, len(transcript), 3)]
+        parts = []
+        assert list(iter_dialogue(_token_lines(tokens, parts))) == parse_dialogue(
+            transcript
+        )
+        assert "".join(parts) == transcript
+
+
+class TestTextStream:
+    """Tests for streaming completions under the completion slot limit."""
+
+    def test_slot_released_before_tokens_are_consumed(self):
+        """Test a slow consumer does not keep a completion slot busy."""
+        import types
+
+        import services
+        from config import config
+
+        def create(model, messages, stream):
+            return [
+                types.SimpleNamespace(
+                    choices=[
+                        types.SimpleNamespace(
+                            delta=types.SimpleNamespace(content=token)
+                        )
+                    ]
+                )
+                for token in ("Host: Hi", "\n", "Expert: Hello")
+            ]
+
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        tokens = services.generate_text_stream(client, "model", "Text", "Prompt")
+
+        assert next(tokens) == "Host: Hi"
+        # The stream has ended, so every slot is free while tokens wait
+        acquired = [
+            services._completion_slots.acquire(timeout=5)
+            for _ in range(config.LLM_CONCURRENCY)
+        ]
+        for ok in acquired:
+            if ok:
+                services._completion_slots.release()
+        assert all(acquired)
+        assert list(tokens) == ["\n", "Expert: Hello"]
+
+    def test_stream_error_is_raised_to_the_consumer(self):
+        """Test an error from the provider reaches the caller."""
+        import types
+
+        from services import generate_text_stream
+
+        def create(model, messages, stream):
+            raise RuntimeError("provider down")
+
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        with pytest.raises(RuntimeError, match="provider down"):
+            list(generate_text_stream(client, "model", "Text", "Prompt"))
+
+
+class TestSaveUpload:
+    """Tests for upload spooling and single-pass hashing."""
+
+    def test_spooled_upload_hashed_once(self, tmp_path):
+        """Test the spool is renamed into place with the hash taken while spooling."""
+        import io
+
+        from flask import Flask, request
+        from utils.uploads import UploadRequest, _content_hasher, save_upload
+
+        app = Flask(__name__)
+        app.request_class = UploadRequest
+        app.config["UPLOAD_FOLDER"] = str(tmp_path)
+
+        @app.route("/", methods=["POST"])
+        def upload():
+            return save_upload(request.files["file"], str(tmp_path / "paper.pdf"))
+
+        data = os.urandom(3 * 1024 * 1024 + 7)
+        response = app.test_client().post(
+            "/", data={"file": (io.BytesIO(data), "paper.pdf")}
+        )
+
+        assert response.get_data(as_text=True) == _content_hasher(data).hexdigest()
+        assert (tmp_path / "paper.pdf").read_bytes() == data
+        assert os.listdir(tmp_path) == ["paper.pdf"]
+
+    def test_stream_copied_and_hashed(self, tmp_path):
+        """Test a stream that was not spooled is copied and hashed in one pass."""
+        import io
+
+        from werkzeug.datastructures import FileStorage
+        from utils.uploads import _content_hasher, save_upload
+
+        data = os.urandom(2 * 1024 * 1024 + 7)
+        digest = save_upload(FileStorage(io.BytesIO(data)), str(tmp_path / "a.pdf"))
+
+        assert digest == _content_hasher(data).hexdigest()
+        assert (tmp_path / "a.pdf").read_bytes() == data
+
+
+class TestEncodePodcast:
+    """Tests for encoding podcast audio to MP3 as it is generated."""
+
+    @pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+    def test_encode_podcast_streams_chunks(self, tmp_path):
+        """Test podcast chunks are encoded as they arrive."""
+        from utils.audio import PCMAudio, encode_podcast
+
+        output_path = tmp_path / "podcast.mp3"
+
+        def chunks():
+            for i in range(3):
+                yield PCMAudio(bytes([i]) * 4800, 24000, 1, 2)
+                # The encoder is already writing before the next chunk exists
+                assert (tmp_path / "podcast.mp3.tmp").exists()
+
+        encode_podcast(chunks(), str(output_path))
+
+        assert output_path.exists()
+        assert not (tmp_path / "podcast.mp3.tmp").exists()
@@ -1,4 +1,13 @@
-from utils.cache import RagFlowCache, ragflow_cache
-from utils.audio import get_audio_filename
+from utils.cache import RagFlowCache, ragflow_cache, document_content_cache
+from utils.audio import get_audio_filename, encode_mp3
+from utils.uploads import UploadRequest, save_upload
 
-__all__ = ["RagFlowCache", "ragflow_cache", "get_audio_filename"]
+__all__ = [
+    "RagFlowCache",
+    "ragflow_cache",
+    "document_content_cache",
+    "get_audio_filename",
+    "encode_mp3",
+    "UploadRequest",
+    "save_upload",
+]
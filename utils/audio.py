@@ -1,13 +1,204 @@
+import io
+import itertools
 import os
 import re
+import subprocess
+import wave
+from collections import namedtuple
+
+# lameenc encodes MP3 in-process - fall back to an ffmpeg subprocess if not available
+try:
+    import lameenc
+
+    LAMEENC_AVAILABLE = True
+except ImportError:
+    LAMEENC_AVAILABLE = False
+
+# ffmpeg raw input formats for each PCM sample width (in bytes)
+PCM_FORMATS = {1: "u8", 2: "s16le", 4: "s32le"}
+
+MP3_BITRATE_KBPS = 128  # Same as ffmpeg's libmp3lame default
+
+# Characters dropped from a PDF's filename to name its podcast MP3
+AUDIO_NAME_UNSAFE_RE = re.compile(r"[^a-zA-Z0-9\-_]")
+
+# Raw interleaved PCM plus the format needed to interpret it
+PCMAudio = namedtuple("PCMAudio", ["data", "frame_rate", "channels", "sample_width"])
 
 
 def get_audio_filename(pdf_file):
-    name = pdf_file.filename
+    name = pdf_file.storage_name or os.path.splitext(pdf_file.filename or "")[0]
     if name:
-        name = os.path.splitext(name)[0]
-        name = re.sub(r"[^a-zA-Z0-9\-_]", "", name)
+        name = AUDIO_NAME_UNSAFE_RE.sub("", name)
         name = name[:40]
         if name:
             return f"{name}_{pdf_file.id}.mp3"
     return f"audio_{pdf_file.id}.mp3"
+
+
+def read_wav(wav_data):
+    """
+    Unpack WAV bytes into PCMAudio.
+
+    Formats the wave module can't read (e.g. float samples) are converted to
+    16-bit PCM by ffmpeg first.
+    """
+    try:
+        return _unpack_wav(wav_data)
+    except (wave.Error, EOFError):
+        return _unpack_wav(
+            _run_ffmpeg(
+                ["-i", "pipe:0", "-c:a", "pcm_s16le", "-f", "wav", "pipe:1"], wav_data
+            )
+        )
+
+
+def _unpack_wav(wav_data):
+    with wave.open(io.BytesIO(wav_data)) as wav:
+        return PCMAudio(
+            wav.readframes(wav.getnframes()),
+            wav.getframerate(),
+            wav.getnchannels(),
+            wav.getsampwidth(),
+        )
+
+
+def convert_pcm(audio, frame_rate, channels, sample_width):
+    """Resample/remix PCMAudio to another format with ffmpeg."""
+    if (audio.frame_rate, audio.channels, audio.sample_width) == (
+        frame_rate,
+        channels,
+        sample_width,
+    ):
+        return audio
+    data = _run_ffmpeg(
+        _raw_pcm_args(audio.frame_rate, audio.channels, audio.sample_width)
+        + ["-i", "pipe:0"]
+        + _raw_pcm_args(frame_rate, channels, sample_width)
+        + ["pipe:1"],
+        audio.data,
+    )
+    return PCMAudio(data, frame_rate, channels, sample_width)
+
+
+def silence(duration_ms, frame_rate, channels, sample_width):
+    """PCM silence in the given format (unsigned 8-bit centres on 0x80)."""
+    frames = frame_rate * duration_ms // 1000
+    sample = b"\x80" if sample_width == 1 else b"\x00" * sample_width
+    return sample * (frames * channels)
+
+
+def encode_mp3(pcm_data, output_path, frame_rate, channels=1, sample_width=2):
+    """Encode raw PCM to an MP3 file."""
+    with MP3Writer(output_path, frame_rate, channels, sample_width) as mp3:
+        mp3.write(pcm_data)
+
+
+def encode_podcast(chunks, output_path):
+    """
+    Encode PCMAudio chunks (all in one format) to an MP3 file while they are
+    still being generated, so no copy of the whole podcast is kept in memory.
+    """
+    chunks = iter(chunks)
+    first = next(chunks)
+    with MP3Writer(
+        output_path, first.frame_rate, first.channels, first.sample_width
+    ) as mp3:
+        for chunk in itertools.chain([first], chunks):
+            mp3.write(chunk.data)
+
+
+class MP3Writer:
+    """
+    Incremental MP3 encoder; PCM passed to write() is encoded straight away.
+
+    16-bit PCM is encoded in-process with lameenc when it is installed;
+    otherwise it is piped into an ffmpeg process, which still avoids writing
+    an intermediate WAV file and re-reading it. The MP3 replaces output_path
+    in one step on close(), so a failed encode keeps the previous file and
+    players never see a half-written one.
+    """
+
+    def __init__(self, output_path, frame_rate, channels=1, sample_width=2):
+        self._output_path = output_path
+        self._tmp_path = f"{output_path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._encoder = None
+        self._ffmpeg = None
+        if LAMEENC_AVAILABLE and sample_width == 2:
+            self._encoder = lameenc.Encoder()
+            self._encoder.set_bit_rate(MP3_BITRATE_KBPS)
+            self._encoder.set_in_sample_rate(frame_rate)
+            self._encoder.set_channels(channels)
+            self._encoder.set_quality(2)
+        else:
+            self._ffmpeg = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error"]
+                + _raw_pcm_args(frame_rate, channels, sample_width)
+                + ["-i", "pipe:0", "-c:a", "libmp3lame"]
+                + ["-b:a", f"{MP3_BITRATE_KBPS}k", "-f", "mp3", "pipe:1"],
+                stdin=subprocess.PIPE,
+                stdout=self._file,
+                stderr=subprocess.PIPE,
+            )
+
+    def write(self, pcm_data):
+        if self._encoder:
+            self._file.write(self._encoder.encode(pcm_data))
+        else:
+            self._ffmpeg.stdin.write(pcm_data)
+
+    def close(self):
+        if self._encoder:
+            self._file.write(self._encoder.flush())
+        else:
+            self._ffmpeg.stdin.close()
+            stderr = self._ffmpeg.stderr.read()
+            if self._ffmpeg.wait() != 0:
+                self.abort()
+                raise RuntimeError(
+                    f"ffmpeg failed: {stderr.decode(errors='replace').strip()}"
+                )
+        self._file.close()
+        os.replace(self._tmp_path, self._output_path)
+
+    def abort(self):
+        """Stop encoding and leave output_path untouched."""
+        if self._ffmpeg and self._ffmpeg.poll() is None:
+            self._ffmpeg.kill()
+            self._ffmpeg.wait()
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _raw_pcm_args(frame_rate, channels, sample_width):
+    return [
+        "-f",
+        PCM_FORMATS[sample_width],
+        "-ar",
+        str(frame_rate),
+        "-ac",
+        str(channels),
+    ]
+
+
+def _run_ffmpeg(args, input_data):
+    """Run ffmpeg with input_data on stdin and return what it wrote to stdout."""
+    proc = subprocess.run(
+        ["ffmpeg", "-loglevel", "error"] + args, input=input_data, capture_output=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed: {proc.stderr.decode(errors='replace').strip()}"
+        )
+    return proc.stdout
@@ -1,18 +1,32 @@
 import time
 import threading
+from collections import OrderedDict
 from functools import lru_cache
 from typing import Any, Callable, Optional
 import hashlib
 import json
 
+from config import config
+
 
 class RagFlowCache:
     """Thread-safe cache for Ragflow API responses."""
 
+    # Per-key locks are striped over a fixed set so they never need cleanup
+    KEY_LOCK_STRIPES = 64
+
     def __init__(self, ttl_seconds=300):
         self._cache = {}
         self._ttl = ttl_seconds
         self._lock = threading.RLock()
+        self._key_locks = [threading.Lock() for _ in range(self.KEY_LOCK_STRIPES)]
+
+    def lock_for(self, key):
+        """
+        Lock to hold while filling key on a miss, so concurrent callers wait
+        for the first fetch and re-check the cache instead of repeating it.
+        """
+        return self._key_locks[hash(key) % self.KEY_LOCK_STRIPES]
 
     def get(self, key):
         with self._lock:
@@ -25,16 +39,68 @@ class RagFlowCache:
 
     def set(self, key, data):
         with self._lock:
-            self._cache[key] = (data, time.time())
+            now = time.time()
+            if key not in self._cache:
+                self._purge_expired(now)
+            self._cache[key] = (data, now)
 
     def invalidate(self, key):
         with self._lock:
             if key in self._cache:
                 del self._cache[key]
 
+    def _purge_expired(self, now):
+        expired = [
+            key
+            for key, (_, timestamp) in self._cache.items()
+            if now - timestamp >= self._ttl
+        ]
+        for key in expired:
+            del self._cache[key]
+
+
+class LRUCache:
+    """Thread-safe cache holding at most maxsize entries, least recent first out."""
+
+    def __init__(self, maxsize=128):
+        self._cache = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+    def set(self, key, data):
+        with self._lock:
+            self._cache[key] = data
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
 
 ragflow_cache = RagFlowCache(ttl_seconds=300)
 
+# Full document text fetched from Ragflow, shared by every feature that needs it
+document_content_cache = RagFlowCache(ttl_seconds=config.DOCUMENT_CACHE_TTL)
+
+
+def document_content_key(dataset_id, document_id):
+    return f"content_{dataset_id}_{document_id}"
+
+
+# A file's figure and table dicts for the figures panel, as (figure_url,
+# elements) per file_id. Elements never change after upload, so only
+# deleting the file drops its entry.
+pdf_elements_cache = LRUCache(maxsize=config.PDF_ELEMENTS_CACHE_SIZE)
+
 
 class SimpleCache:
     """Thread-safe in-memory cache with TTL support."""
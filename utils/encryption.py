@@ -1,5 +1,6 @@
 import os
 import base64
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
@@ -81,6 +82,9 @@ def encrypt_key(key: str) -> str:
     return KeyEncryption.get_instance().encrypt(key)
 
 
+# Settings decrypt their keys on every access (each Ragflow/TTS/text client
+# lookup); the ciphertexts rarely change, so remember their plaintext
+@lru_cache(maxsize=32)
 def decrypt_key(key: str) -> str:
     """Decrypt an API key."""
     return KeyEncryption.get_instance().decrypt(key)
@@ -0,0 +1,72 @@
+"""JSON encoding helpers that use orjson when it is installed."""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional - fall back to the standard library if not available
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    # orjson 3.9+ can embed already-serialized JSON without parsing it
+    _ORJSON_FRAGMENT = getattr(orjson, "Fragment", None)
+except ImportError:
+    ORJSON_AVAILABLE = False
+    _ORJSON_FRAGMENT = None
+
+
+def dumps(obj):
+    """Serialize obj to a compact JSON string."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj)
+
+
+def loads(data):
+    """Deserialize a JSON str or bytes document."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def raw(data):
+    """
+    Wrap a stored JSON document for inclusion in a response.
+
+    With orjson 3.9+ the text is spliced into the output as-is instead of
+    being parsed and serialized again; otherwise it is parsed.
+    """
+    if _ORJSON_FRAGMENT is not None:
+        return _ORJSON_FRAGMENT(data)
+    return loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+
+    Dates and other types orjson would format differently are handed to
+    Flask's default serializer, so responses keep their existing shape.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if not ORJSON_AVAILABLE:
+            return super().dumps(obj, **kwargs)
+
+        option = (
+            _ORJSON_OPTIONS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if not ORJSON_AVAILABLE:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
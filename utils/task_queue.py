@@ -4,7 +4,6 @@ SQLite-backed task queue for background processing.
 This provides a simple queue system without requiring Redis or external dependencies.
 """
 
-import json
 import threading
 import time
 import uuid
@@ -12,7 +11,8 @@ from typing import Optional, Callable, List, Dict, Any
 from datetime import datetime, timedelta
 from enum import Enum
 
-from database import db, Task
+from database import db, forget_task_status, Task
+from utils import fastjson
 
 
 class TaskStatus(str, Enum):
@@ -44,6 +44,8 @@ class TaskQueue:
         self._workers: List[threading.Thread] = []
         self._running = False
         self._task_handlers: Dict[str, Callable] = {}
+        # Set when work is queued so idle workers pick it up without polling
+        self._wakeup = threading.Event()
 
     @classmethod
     def get_instance(cls, max_workers: int = 3) -> "TaskQueue":
@@ -84,7 +86,7 @@ class TaskQueue:
         task = Task(
             id=task_id,
             status=TaskStatus.PENDING if not depends_on else TaskStatus.PENDING,
-            result=json.dumps(
+            result=fastjson.dumps(
                 {
                     "task_type": task_type,
                     "file_id": file_id,
@@ -100,6 +102,7 @@ class TaskQueue:
 
         db.session.add(task)
         db.session.commit()
+        self._wakeup.set()
 
         return task_id
 
@@ -129,17 +132,30 @@ class TaskQueue:
 
         return task_ids
 
+    def pending_count(self) -> int:
+        """Number of tasks waiting for a worker."""
+        return (
+            db.session.query(db.func.count(Task.id))
+            .filter(Task.status == TaskStatus.PENDING)
+            .scalar()
+        )
+
     def get_next_task(self) -> Optional[Task]:
         """Get the next pending task (highest priority, oldest)."""
         # Find tasks that aren't blocked by dependencies
-        pending_tasks = (
-            Task.query.filter(Task.status.in_([TaskStatus.PENDING, TaskStatus.QUEUED]))
-            .order_by(Task.status, Task.result.desc())
-            .all()
+        pending_tasks = [
+            (task, fastjson.loads(task.result))
+            for task in Task.query.filter(Task.status == TaskStatus.PENDING).all()
+        ]
+        # Clicked-for jobs (priority 5) go ahead of bulk imports (10)
+        pending_tasks.sort(
+            key=lambda item: (
+                item[1].get("priority", 5),
+                item[1].get("created_at", ""),
+            )
         )
 
-        for task in pending_tasks:
-            task_data = json.loads(task.result)
+        for task, task_data in pending_tasks:
 
             # Check if dependencies are met
             depends_on = task_data.get("depends_on")
@@ -150,7 +166,7 @@ class TaskQueue:
                 elif dep_task and dep_task.status == TaskStatus.ERROR:
                     # Dependency failed, mark this as error too
                     task.status = TaskStatus.ERROR
-                    task.result = json.dumps(
+                    task.result = fastjson.dumps(
                         {**task_data, "error": f"Dependency {depends_on} failed"}
                     )
                     db.session.commit()
@@ -162,40 +178,33 @@ class TaskQueue:
         return None
 
     def process_task(self, task: Task, app) -> bool:
-        """Process a single task."""
-        task_data = json.loads(task.result)
+        """Process a single task already marked processing by claim_task."""
+        task_id = task.id
+        task_data = fastjson.loads(task.result)
         task_type = task_data.get("task_type")
 
         # Get handler
         handler = self._task_handlers.get(task_type)
         if not handler:
             task.status = TaskStatus.ERROR
-            task.result = json.dumps(
+            task.result = fastjson.dumps(
                 {**task_data, "error": f"No handler for task type: {task_type}"}
             )
             db.session.commit()
             return False
 
-        # Mark as processing
-        task.status = TaskStatus.PROCESSING
-        task.result = json.dumps(
-            {
-                **task_data,
-                "attempts": task_data.get("attempts", 0) + 1,
-                "started_at": datetime.utcnow().isoformat(),
-            }
-        )
-        db.session.commit()
-
         try:
             # Execute handler
-            handler(app, task.id, task_data["file_id"])
+            handler(app, task_id, task_data["file_id"])
 
-            # Check if successful by looking at task status
-            db.session.refresh(task)
+            # Check if successful by looking at task status; the status
+            # endpoints delete a finished task as soon as they report it
+            task = db.session.get(Task, task_id, populate_existing=True)
+            if task is None:
+                return True
             if task.status == TaskStatus.PROCESSING:
                 task.status = TaskStatus.COMPLETE
-                task.result = json.dumps(
+                task.result = fastjson.dumps(
                     {**task_data, "completed_at": datetime.utcnow().isoformat()}
                 )
                 db.session.commit()
@@ -212,7 +221,7 @@ class TaskQueue:
                 # Schedule retry with exponential backoff
                 task.status = TaskStatus.RETRYING
                 delay = min(2**attempts * 60, 3600)  # Max 1 hour
-                task.result = json.dumps(
+                task.result = fastjson.dumps(
                     {
                         **task_data,
                         "attempts": attempts,
@@ -224,7 +233,7 @@ class TaskQueue:
                 )
             else:
                 task.status = TaskStatus.ERROR
-                task.result = json.dumps(
+                task.result = fastjson.dumps(
                     {
                         **task_data,
                         "error": str(e),
@@ -241,9 +250,9 @@ class TaskQueue:
         if not task:
             return False
 
-        task_data = json.loads(task.result)
+        task_data = fastjson.loads(task.result)
         task.status = TaskStatus.PENDING
-        task.result = json.dumps({**task_data, "attempts": 0, "retry_reason": "manual"})
+        task.result = fastjson.dumps({**task_data, "attempts": 0, "retry_reason": "manual"})
         db.session.commit()
         return True
 
@@ -253,7 +262,7 @@ class TaskQueue:
         if not task:
             return None
 
-        task_data = json.loads(task.result) if task.result else {}
+        task_data = fastjson.loads(task.result) if task.result else {}
 
         return {
             "id": task.id,
@@ -276,18 +285,18 @@ class TaskQueue:
             all_tasks = query.all()
             tasks = []
             for task in all_tasks:
-                task_data = json.loads(task.result) if task.result else {}
+                task_data = fastjson.loads(task.result) if task.result else {}
                 if task_data.get("file_id") == file_id:
                     tasks.append(task)
             tasks.sort(
-                key=lambda t: json.loads(t.result).get("created_at", ""), reverse=True
+                key=lambda t: fastjson.loads(t.result).get("created_at", ""), reverse=True
             )
         else:
             tasks = query.order_by(Task.id.desc()).limit(100).all()
 
         result = []
         for task in tasks:
-            task_data = json.loads(task.result) if task.result else {}
+            task_data = fastjson.loads(task.result) if task.result else {}
             result.append(
                 {
                     "id": task.id,
@@ -310,7 +319,7 @@ class TaskQueue:
         tasks = [
             t
             for t in all_tasks
-            if json.loads(t.result or "{}").get("batch_id") == batch_id
+            if fastjson.loads(t.result or "{}").get("batch_id") == batch_id
         ]
 
         if not tasks:
@@ -333,7 +342,7 @@ class TaskQueue:
 
         tasks_data = []
         for task in tasks:
-            task_data = json.loads(task.result) if task.result else {}
+            task_data = fastjson.loads(task.result) if task.result else {}
             if task.status == TaskStatus.COMPLETE:
                 status_counts["complete"] += 1
             elif task.status == TaskStatus.ERROR:
@@ -357,11 +366,62 @@ class TaskQueue:
 
         return status_counts
 
+    def claim_task(self, task: Task) -> bool:
+        """
+        Mark a pending task processing unless another worker got to it first.
+
+        One conditional UPDATE both claims the task and records the attempt.
+        """
+        task_data = fastjson.loads(task.result)
+        claimed = db.session.execute(
+            db.update(Task)
+            .where(Task.id == task.id, Task.status == TaskStatus.PENDING)
+            .values(
+                status=TaskStatus.PROCESSING,
+                result=fastjson.dumps(
+                    {
+                        **task_data,
+                        "attempts": task_data.get("attempts", 0) + 1,
+                        "started_at": datetime.utcnow().isoformat(),
+                    }
+                ),
+            )
+        ).rowcount
+        db.session.commit()
+        # The ORM events that refresh cached status polls don't see Core UPDATEs
+        forget_task_status(task.id)
+        return claimed == 1
+
+    def requeue_interrupted(self) -> int:
+        """
+        Put queued tasks that were mid-flight when the process stopped back
+        in the queue.
+
+        Runs before this process starts its workers, so it assumes a single
+        process works the queue (the default one-worker gunicorn setup).
+        """
+        stranded = Task.query.filter(
+            Task.status.in_([TaskStatus.QUEUED, TaskStatus.PROCESSING])
+        ).all()
+        requeued = 0
+        for task in stranded:
+            task_data = fastjson.loads(task.result) if task.result else {}
+            if task_data.get("task_type") in self._task_handlers:
+                task.status = TaskStatus.PENDING
+                requeued += 1
+        db.session.commit()
+        return requeued
+
     def start_workers(self, app, num_workers: Optional[int] = None):
-        """Start background worker threads."""
+        """Start background worker threads, or wake them if already running."""
         if self._running:
+            self._wakeup.set()
             return
 
+        requeued = self.requeue_interrupted()
+        if requeued:
+            app.logger.info(f"Requeued {requeued} interrupted task(s)")
+
         self._running = True
         num_workers = num_workers or self.max_workers
 
@@ -388,15 +448,13 @@ class TaskQueue:
                     task = self.get_next_task()
 
                     if task:
-                        # Mark as queued
-                        task.status = TaskStatus.QUEUED
-                        db.session.commit()
-
-                        # Process it
-                        self.process_task(task, app)
+                        if self.claim_task(task):
+                            db.session.refresh(task)
+                            self.process_task(task, app)
                     else:
-                        # No work, sleep briefly
-                        time.sleep(1)
+                        # No work; wait for enqueue() or poll again shortly
+                        self._wakeup.wait(1)
+                        self._wakeup.clear()
 
             except Exception as e:
                 print(f"Worker {worker_id} error: {e}")
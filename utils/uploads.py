@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request, current_app
+
+# BLAKE3 is much faster than SHA-256 for content hashing when available
+try:
+    from blake3 import blake3 as _content_hasher
+
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    _content_hasher = hashlib.sha256
+    BLAKE3_AVAILABLE = False
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+SPOOL_PREFIX = ".upload-"
+PART_PREFIX = ".chunked-"  # Resumable uploads still being received
+
+
+class _HashingSpool:
+    """Spool file wrapper that hashes the upload as Werkzeug writes it."""
+
+    def __init__(self, spool):
+        self._spool = spool
+        self.hasher = _content_hasher()
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._spool.write(data)
+
+    def __iter__(self):
+        return iter(self._spool)
+
+    def __getattr__(self, name):
+        return getattr(self._spool, name)
+
+
+class UploadRequest(Request):
+    """
+    Request class that spools multipart file parts straight into the upload
+    folder instead of an in-memory buffer or a temp file elsewhere.
+
+    Werkzeug writes the body into the spool file as it parses it, so
+    save_upload() only has to rename it into place.
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        # Werkzeug writes the body in small parser-sized pieces; buffer them
+        # into 1 MiB writes
+        spool = tempfile.NamedTemporaryFile(
+            "wb+",
+            buffering=UPLOAD_CHUNK_SIZE,
+            dir=current_app.config["UPLOAD_FOLDER"],
+            prefix=SPOOL_PREFIX,
+            suffix=".part",
+            delete=False,
+        )
+        self.__dict__.setdefault("_spool_paths", []).append(spool.name)
+        return _HashingSpool(spool)
+
+    def close(self):
+        super().close()
+        # Remove spool files that were never moved into place
+        for path in self.__dict__.get("_spool_paths", ()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def save_upload(file, filepath):
+    """
+    Move an uploaded file to filepath without copying its bytes if possible.
+
+    Returns the hex content hash of the file, computed while it was spooled
+    (or while copying), so the upload never has to be read back to hash it.
+    """
+    stream = file.stream
+    spool_path = getattr(stream, "name", None)
+    if isinstance(spool_path, str) and os.path.basename(spool_path).startswith(
+        SPOOL_PREFIX
+    ):
+        stream.close()
+        os.replace(spool_path, filepath)
+        return stream.hasher.hexdigest()
+    return save_stream(stream, filepath)
+
+
+def save_stream(stream, filepath):
+    """
+    Copy a stream (e.g. request.stream for a raw upload body) to filepath a
+    chunk at a time, returning its hex content hash.
+
+    A partly written file is removed if the stream fails, e.g. when the body
+    exceeds MAX_CONTENT_LENGTH or the client disconnects.
+    """
+    hasher = _content_hasher()
+    try:
+        with open(filepath, "wb", buffering=0) as f:
+            _copy_stream(stream, f, hasher)
+    except BaseException:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+    return hasher.hexdigest()
+
+
+def write_stream_at(stream, filepath, offset):
+    """
+    Write one chunk of a resumable upload into filepath at offset and return
+    the file's size afterwards.
+
+    A chunk cut short by a disconnect leaves what did arrive, so the client
+    can carry on from the returned size.
+    """
+    mode = "r+b" if os.path.exists(filepath) else "wb"
+    with open(filepath, mode, buffering=0) as f:
+        f.seek(offset)
+        try:
+            _copy_stream(stream, f)
+        finally:
+            size = os.fstat(f.fileno()).st_size
+    return size
+
+
+def hash_file(filepath):
+    """Hex content hash of a file on disk, with the same hasher as uploads."""
+    hasher = _content_hasher()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def remove_stale_parts(folder, max_age):
+    """Delete resumable uploads that haven't received a chunk in max_age seconds."""
+    cutoff = time.time() - max_age
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(PART_PREFIX) and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def _copy_stream(stream, f, hasher=None):
+    # Reuse one buffer for every chunk; the output is unbuffered because each
+    # write is already a full chunk
+    buffer = bytearray(UPLOAD_CHUNK_SIZE)
+    view = memoryview(buffer)
+    readinto = getattr(stream, "readinto", None)
+    while True:
+        if readinto is not None:
+            size = readinto(buffer)
+            chunk = view[:size]
+        else:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            size = len(chunk)
+        if not size:
+            break
+        if hasher is not None:
+            hasher.update(chunk)
+        f.write(chunk)